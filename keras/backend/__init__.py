@@ -12,6 +12,8 @@ from .common import cast_to_floatx
 from .common import image_data_format
 from .common import set_image_data_format
 from .common import normalize_data_format
+from .common import function_cache_dir
+from .common import set_function_cache_dir
 
 # Set Keras' recursion limit high enough.
 sys.setrecursionlimit(10000)
@@ -49,6 +51,7 @@ if os.path.exists(_config_path):
     set_floatx(_floatx)
     set_epsilon(_epsilon)
     set_image_data_format(_image_data_format)
+    set_function_cache_dir(_config.get('function_cache_dir'))
     _BACKEND = _backend
 
 # Save config file, if possible.
@@ -80,6 +83,10 @@ if 'KERAS_BACKEND' in os.environ:
     if _backend:
         _BACKEND = _backend
 
+# Set the compiled-function cache from KERAS_FUNCTION_CACHE_DIR, if applicable.
+if 'KERAS_FUNCTION_CACHE_DIR' in os.environ:
+    set_function_cache_dir(os.environ['KERAS_FUNCTION_CACHE_DIR'] or None)
+
 # Import backend functions.
 if _BACKEND == 'cntk':
     sys.stderr.write('Using CNTK backend\n')
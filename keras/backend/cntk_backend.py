@@ -237,6 +237,14 @@ def bias_add(x, bias, data_format=None):
     return x + reshape(bias, shape)
 
 
+def fused_bias_act(x, bias=None, activation=None):
+    if bias is not None:
+        x = x + bias
+    if activation is not None:
+        x = activation(x)
+    return x
+
+
 def eval(x):
     if isinstance(x, C.cntk_py.Function):
         return x.eval()
@@ -1089,6 +1097,22 @@ def batch_normalization(x, mean, var, beta, gamma, axis=-1, epsilon=1e-3):
     return (x - mean) / C.sqrt(var + epsilon) * gamma + beta
 
 
+def layer_norm(x, gamma=None, beta=None, axis=-1, epsilon=1e-3):
+    centered = x - mean(x, axis=axis, keepdims=True)
+    var = mean(C.square(centered), axis=axis, keepdims=True)
+    output = centered / C.sqrt(var + epsilon)
+    if gamma is not None:
+        output = output * gamma
+    if beta is not None:
+        output = output + beta
+    return output
+
+
+def residual_add_norm(x, residual, gamma=None, beta=None, axis=-1,
+                      epsilon=1e-3):
+    return layer_norm(x + residual, gamma, beta, axis, epsilon)
+
+
 def concatenate(tensors, axis=-1):
     if len(tensors) == 0:
         return None
@@ -2173,6 +2197,11 @@ def stop_gradient(variables):
         return C.stop_gradient(variables)
 
 
+def recompute_grad(function, inputs, variables=None):
+    raise NotImplementedError('CNTK Backend: gradient checkpointing '
+                              'is not supported.')
+
+
 def switch(condition, then_expression, else_expression):
     ndim_cond = ndim(condition)
     ndim_expr = ndim(then_expression)
@@ -8,6 +8,8 @@ import numpy as np
 _FLOATX = 'float32'
 _EPSILON = 1e-7
 _IMAGE_DATA_FORMAT = 'channels_last'
+# Directory of the persistent compiled-function cache (None: disabled).
+_FUNCTION_CACHE_DIR = None
 
 
 def epsilon():
@@ -147,6 +149,45 @@ def set_image_data_format(data_format):
     _IMAGE_DATA_FORMAT = str(data_format)
 
 
+def function_cache_dir():
+    """Returns the directory of the persistent compiled-function cache.
+
+    When set, backends that compile functions ahead of time (Theano)
+    store the compiled functions created by `K.function` in this directory
+    and reuse them in later processes, skipping graph optimization and
+    compilation.
+
+    # Returns
+        A string, or `None` if the cache is disabled (default).
+
+    # Example
+    ```python
+        >>> keras.backend.function_cache_dir()
+        '/home/user/.keras/functions'
+    ```
+    """
+    return _FUNCTION_CACHE_DIR
+
+
+def set_function_cache_dir(path):
+    """Sets the directory of the persistent compiled-function cache.
+
+    # Arguments
+        path: string, directory where compiled functions are stored,
+            or `None` to disable the cache.
+
+    # Example
+    ```python
+        >>> from keras import backend as K
+        >>> K.set_function_cache_dir('/tmp/keras_functions')
+        >>> K.function_cache_dir()
+        '/tmp/keras_functions'
+    ```
+    """
+    global _FUNCTION_CACHE_DIR
+    _FUNCTION_CACHE_DIR = path if path is None else str(path)
+
+
 def normalize_data_format(value):
     """Checks that the value correspond to a valid data format.
 
@@ -2009,6 +2009,52 @@ def batch_normalization(x, mean, var, beta, gamma, axis=-1, epsilon=1e-3):
     return tf.nn.batch_normalization(x, mean, var, beta, gamma, epsilon)
 
 
+def layer_norm(x, gamma=None, beta=None, axis=-1, epsilon=1e-3):
+    """Normalizes each sample of x along an axis (layer normalization).
+
+    I.e. returns:
+    `output = (x - mean) / sqrt(var + epsilon) * gamma + beta`,
+    with the mean and variance computed along `axis` for each sample.
+    The scale `gamma / sqrt(var + epsilon)` and the offset are computed
+    on the reduced shape, so only two elementwise ops are applied to
+    the full-size tensor.
+
+    # Arguments
+        x: Input tensor or variable.
+        gamma: Tensor by which to scale the input (or `None`).
+            It must broadcast against `x`, e.g. a vector when `axis=-1`.
+        beta: Tensor with which to center the input (or `None`).
+        axis: Integer, the axis that should be normalized.
+        epsilon: Fuzz factor.
+
+    # Returns
+        A tensor with the same shape as `x`.
+    """
+    mean, var = tf.nn.moments(x, [axis], keep_dims=True)
+    return tf.nn.batch_normalization(x, mean, var, beta, gamma, epsilon)
+
+
+def residual_add_norm(x, residual, gamma=None, beta=None, axis=-1,
+                      epsilon=1e-3):
+    """Adds a residual connection to x and applies layer normalization.
+
+    I.e. returns `layer_norm(x + residual, gamma, beta, axis, epsilon)`,
+    the post-norm residual block of Transformer-style models.
+
+    # Arguments
+        x: Input tensor or variable.
+        residual: Tensor with the same shape as `x`.
+        gamma: Tensor by which to scale the sum (or `None`).
+        beta: Tensor with which to center the sum (or `None`).
+        axis: Integer, the axis that should be normalized.
+        epsilon: Fuzz factor.
+
+    # Returns
+        A tensor with the same shape as `x`.
+    """
+    return layer_norm(tf.add(x, residual), gamma, beta, axis, epsilon)
+
+
 # SHAPE OPERATIONS
 
 def concatenate(tensors, axis=-1):
@@ -2701,6 +2747,10 @@ class Function(object):
         outputs: Output tensors to fetch.
         updates: Additional update ops to be run at function call.
         name: a name to help users identify what this function does.
+        shape_cache_size: Accepted for compatibility with the Theano
+            backend, whose functions can be compiled per input shapes.
+            TensorFlow graphs are not specialized to the input shapes;
+            use `warm_up` to prepare the function for known shapes.
         session_kwargs: arguments to `tf.Session.run()`:
             `fetches`, `feed_dict`,
             `options`, `run_metadata`
@@ -2709,6 +2759,7 @@ class Function(object):
     def __init__(self, inputs, outputs,
                  updates=None,
                  name=None,
+                 shape_cache_size=None,
                  **session_kwargs):
         updates = updates or []
         if not isinstance(inputs, (list, tuple)):
@@ -2808,6 +2859,45 @@ class Function(object):
         self._symbol_vals = symbol_vals
         self._session = session
 
+    def warm_up(self, input_shapes):
+        """Prepares the function for inputs of the given shapes.
+
+        The callable running the graph is created, and the outputs are
+        computed once on zero-valued inputs of the given shapes, without
+        running the updates. The first calls on inputs of these shapes
+        then do not pay for the setup of the feed path or for the
+        shape-dependent setup of the kernels (memory allocation,
+        convolution algorithm selection).
+
+        # Arguments
+            input_shapes: List of shape tuples, one per input.
+        """
+        if py_any(is_sparse(x) for x in self.inputs):
+            return
+        session = get_session()
+        if (self._callable_fn is None or
+                self._feed_arrays != self.inputs or
+                self._feed_symbols or
+                session != self._session):
+            self._make_callable(self.inputs, [], [], session)
+        callable_opts = config_pb2.CallableOptions()
+        for x in self.inputs:
+            callable_opts.feed.append(x.name)
+        feed_keys = sorted(self.feed_dict.keys()) if self.feed_dict else []
+        for key in feed_keys:
+            callable_opts.feed.append(key.name)
+        for x in self.outputs:
+            callable_opts.fetch.append(x.name)
+        outputs_fn = session._make_callable_from_options(callable_opts)
+        array_vals = [np.zeros(shape,
+                               dtype=tf.as_dtype(x.dtype).as_numpy_dtype)
+                      for x, shape in zip(self.inputs, input_shapes)]
+        for key in feed_keys:
+            array_vals.append(
+                np.asarray(self.feed_dict[key],
+                           dtype=tf.as_dtype(key.dtype).as_numpy_dtype))
+        outputs_fn(*array_vals)
+
     def _call(self, inputs):
         if not isinstance(inputs, (list, tuple)):
             raise TypeError('`inputs` should be a list or tuple.')
@@ -2954,6 +3044,55 @@ def stop_gradient(variables):
         return tf.stop_gradient(variables)
 
 
+def recompute_grad(function, inputs, variables=None):
+    """Calls `function`, recomputing it during the backward pass.
+
+    The activations computed inside `function` are not kept for the
+    gradient computation: the backward pass calls `function` again on
+    the same inputs and differentiates the recomputed graph, trading
+    compute for memory (gradient checkpointing).
+
+    # Arguments
+        function: Function mapping a list of tensors to a list of
+            tensors. It must be deterministic (no random ops) and have
+            no side effects, since it is called twice.
+        inputs: List of input tensors of `function`.
+        variables: List of the variables used by `function`
+            that gradients must be computed for.
+
+    # Returns
+        The list of output tensors of `function`.
+    """
+    inputs = list(inputs)
+    variables = [tf.convert_to_tensor(v) for v in variables or []]
+    outputs = function(inputs)
+    num_outputs = len(outputs)
+    name = 'KerasRecomputeGrad_%d' % tf_ops.uid()
+
+    @tf.RegisterGradient(name)
+    def _recompute_grad(op, *grads):
+        grads = [tf.zeros_like(y) if g is None else g
+                 for y, g in zip(outputs, grads[:num_outputs])]
+        # Only recompute once the gradients of the outputs are needed.
+        with tf.control_dependencies(grads):
+            replayed = []
+            for x in inputs:
+                y = tf.identity(x)
+                if hasattr(x, '_keras_shape'):
+                    y._keras_shape = x._keras_shape
+                y._uses_learning_phase = getattr(x, '_uses_learning_phase',
+                                                 False)
+                replayed.append(y)
+        input_grads = tf.gradients(function(replayed), replayed + variables,
+                                   grad_ys=grads,
+                                   colocate_gradients_with_ops=True)
+        return [None] * num_outputs + input_grads
+
+    with tf.get_default_graph().gradient_override_map({'IdentityN': name}):
+        wrapped = tf.identity_n(outputs + inputs + variables)
+    return wrapped[:num_outputs]
+
+
 # CONTROL FLOW
 
 def rnn(step_function, inputs, initial_states,
@@ -4391,6 +4530,29 @@ def bias_add(x, bias, data_format=None):
     return x
 
 
+def fused_bias_act(x, bias=None, activation=None):
+    """Adds a bias vector to the last axis of a tensor and activates it.
+
+    The bias is added with a single `BiasAdd` op, whatever the rank of
+    `x`, which TensorFlow can fuse with the preceding matrix product.
+
+    # Arguments
+        x: Tensor or variable.
+        bias: Bias vector with the size of the last axis of `x`
+            (or `None`).
+        activation: Elementwise function applied to the result
+            (or `None`).
+
+    # Returns
+        Output tensor.
+    """
+    if bias is not None:
+        x = tf.nn.bias_add(x, bias)
+    if activation is not None:
+        x = activation(x)
+    return x
+
+
 # RANDOMNESS
 
 def random_normal(shape, mean=0.0, stddev=1.0, dtype=None, seed=None):
@@ -3,7 +3,11 @@ from __future__ import division
 from __future__ import print_function
 
 from collections import defaultdict
+from collections import OrderedDict
 from contextlib import contextmanager
+import hashlib
+import os
+import warnings
 import theano
 from theano import tensor as T
 from theano.sandbox.rng_mrg import MRG_RandomStreams as RandomStreams
@@ -22,9 +26,11 @@ except ImportError:
     from theano.sandbox.softsign import softsign as T_softsign
 
 import numpy as np
+from six.moves import cPickle as pickle
 from .common import floatx
 from .common import epsilon
 from .common import normalize_data_format
+from .common import function_cache_dir
 from ..utils.generic_utils import transpose_shape
 from ..utils.generic_utils import has_arg
 # Legacy functions
@@ -1653,6 +1659,57 @@ def batch_normalization(x, mean, var, beta, gamma, axis=-1, epsilon=1e-3):
         x, gamma, beta, mean, var, reduction_axes, epsilon)
 
 
+def layer_norm(x, gamma=None, beta=None, axis=-1, epsilon=1e-3):
+    """Normalizes each sample of x along an axis (layer normalization).
+
+    I.e. returns:
+    `output = (x - mean) / sqrt(var + epsilon) * gamma + beta`,
+    with the mean and variance computed along `axis` for each sample.
+    The elementwise ops are fused into a single kernel by the Theano
+    optimizer.
+
+    # Arguments
+        x: Input tensor or variable.
+        gamma: Tensor by which to scale the input (or `None`).
+            It must broadcast against `x`, e.g. a vector when `axis=-1`.
+        beta: Tensor with which to center the input (or `None`).
+        axis: Integer, the axis that should be normalized.
+        epsilon: Fuzz factor.
+
+    # Returns
+        A tensor with the same shape as `x`.
+    """
+    centered = x - T.mean(x, axis=axis, keepdims=True)
+    var = T.mean(T.sqr(centered), axis=axis, keepdims=True)
+    output = centered * T.inv(T.sqrt(var + epsilon))
+    if gamma is not None:
+        output *= gamma
+    if beta is not None:
+        output += beta
+    return output
+
+
+def residual_add_norm(x, residual, gamma=None, beta=None, axis=-1,
+                      epsilon=1e-3):
+    """Adds a residual connection to x and applies layer normalization.
+
+    I.e. returns `layer_norm(x + residual, gamma, beta, axis, epsilon)`,
+    the post-norm residual block of Transformer-style models.
+
+    # Arguments
+        x: Input tensor or variable.
+        residual: Tensor with the same shape as `x`.
+        gamma: Tensor by which to scale the sum (or `None`).
+        beta: Tensor with which to center the sum (or `None`).
+        axis: Integer, the axis that should be normalized.
+        epsilon: Fuzz factor.
+
+    # Returns
+        A tensor with the same shape as `x`.
+    """
+    return layer_norm(x + residual, gamma, beta, axis, epsilon)
+
+
 # TODO remove this function when Theano without
 # T.nnet.bn.batch_normalization_train is deprecated
 def _old_normalize_batch_in_training(x, gamma, beta, reduction_axes,
@@ -2492,33 +2549,229 @@ def print_tensor(x, message=''):
 
 class Function(object):
     """Wrapper around Theano Function
+
+    If `K.function_cache_dir()` is set, the compiled function is stored
+    there, keyed by a hash of the graph, and later instances built from an
+    identical graph (e.g. in another process) reuse it without running
+    the graph optimizer or the compiler again.
+
+    If `shape_cache_size` is set, a function specialized to the shapes of
+    the inputs is compiled for each distinct combination of input shapes
+    (e.g. each bucket of a bucketed dataset), which lets the graph
+    optimizer use the constant shapes (e.g. the number of steps of a
+    `scan`). The last `shape_cache_size` specialized functions are kept,
+    and `cache_hits`/`cache_misses` count the calls served by an already
+    compiled function or not.
     """
 
-    def __init__(self, inputs, outputs, updates=[], name=None, **kwargs):
+    def __init__(self, inputs, outputs, updates=[], name=None,
+                 shape_cache_size=None, **kwargs):
         unique_variables_to_update = {}
         for v, nv in updates:
             if v not in unique_variables_to_update:
                 unique_variables_to_update[v] = nv
-        updates = unique_variables_to_update.items()
-        self.function = theano.function(inputs, outputs, updates=updates,
-                                        allow_input_downcast=True,
-                                        on_unused_input='ignore',
-                                        name=name,
-                                        **kwargs)
+        updates = list(unique_variables_to_update.items())
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.updates = updates
         self.name = name
+        self.kwargs = kwargs
+        self.shape_cache_size = shape_cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._specialized = OrderedDict()
+        self.function = None
+        if not shape_cache_size:
+            self.function = self._compile(self.inputs, self.outputs,
+                                          self.updates, name)
+
+    def _compile(self, inputs, outputs, updates, name):
+        cache_dir = function_cache_dir()
+        if self.kwargs.get('profile'):
+            # Profiled functions collect statistics in their own objects.
+            cache_dir = None
+        if cache_dir is not None:
+            key = _function_cache_key(inputs, outputs, updates, name,
+                                      self.kwargs)
+            cache_path = os.path.join(cache_dir, 'function_' + key + '.pkl')
+            shared = _graph_shared_variables(outputs, updates)
+            function = _load_cached_function(cache_path, shared)
+            if function is not None:
+                return function
+        function = theano.function(inputs, outputs, updates=updates,
+                                   allow_input_downcast=True,
+                                   on_unused_input='ignore',
+                                   name=name,
+                                   **self.kwargs)
+        if cache_dir is not None:
+            _save_cached_function(function, cache_path, shared)
+        return function
+
+    def _specialize(self, shapes):
+        """Compiles the function for inputs of the given shapes.
+        """
+        placeholders = []
+        replace = {}
+        for x, shape in zip(self.inputs, shapes):
+            placeholder = x.type(name=x.name)
+            placeholders.append(placeholder)
+            if (isinstance(x.type, T.TensorType) and
+                    0 < x.ndim == len(shape)):
+                replace[x] = T.specify_shape(placeholder, shape)
+            else:
+                replace[x] = placeholder
+        variables = theano.clone(self.outputs +
+                                 [nv for _, nv in self.updates],
+                                 replace=replace)
+        outputs = variables[:len(self.outputs)]
+        updates = list(zip([v for v, _ in self.updates],
+                           variables[len(self.outputs):]))
+        name = '%s%s' % (self.name or 'function', list(shapes))
+        return self._compile(placeholders, outputs, updates, name)
+
+    def _get_specialized(self, shapes):
+        function = self._specialized.pop(shapes, None)
+        if function is None:
+            function = self._specialize(shapes)
+            if len(self._specialized) >= self.shape_cache_size:
+                # Evict the least recently used function.
+                self._specialized.popitem(last=False)
+        self._specialized[shapes] = function
+        return function
+
+    def warm_up(self, input_shapes):
+        """Compiles the function for inputs of the given shapes in advance.
+
+        Only has an effect if `shape_cache_size` is set.
+
+        # Arguments
+            input_shapes: List of shape tuples, one per input.
+        """
+        if self.shape_cache_size:
+            self._get_specialized(tuple(tuple(shape)
+                                        for shape in input_shapes))
 
     def __call__(self, inputs):
         assert isinstance(inputs, (list, tuple))
-        return self.function(*inputs)
+        if not self.shape_cache_size:
+            return self.function(*inputs)
+        shapes = tuple(np.shape(x) for x in inputs)
+        if shapes in self._specialized:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+        return self._get_specialized(shapes)(*inputs)
+
+
+def _graph_shared_variables(outputs, updates):
+    """Lists the shared variables of a graph in a deterministic order.
+    """
+    variables = list(outputs) + [nv for _, nv in updates]
+    shared = [v for v in theano.gof.graph.inputs(variables)
+              if isinstance(v, theano.compile.SharedVariable)]
+    for v, _ in updates:
+        if v not in shared:
+            shared.append(v)
+    return shared
+
+
+def _function_cache_key(inputs, outputs, updates, name, kwargs):
+    """Hashes everything that determines the compiled function.
+
+    The structure of the graph (including the types of every variable,
+    hence floatx and input ranks) is hashed through its debug print,
+    and the values of the constants are hashed separately since they are
+    only partially printed.
+    """
+    hasher = hashlib.sha256()
+    variables = list(outputs) + [nv for _, nv in updates]
+    config = [getattr(theano.config, flag, None) for flag in
+              ('floatX', 'device', 'mode', 'linker', 'optimizer',
+               'optimizer_including', 'optimizer_excluding',
+               'optimizer_requiring', 'cxx')]
+    description = [theano.__version__, repr(config), str(name),
+                   repr(sorted(kwargs.items())),
+                   repr([(str(x.type), str(x.name)) for x in inputs]),
+                   repr([str(v.name) for v, _ in updates])]
+    description.append(theano.printing.debugprint(
+        variables, file='str', ids='', print_type=True))
+    for text in description:
+        hasher.update(text.encode('utf8'))
+    for v in theano.gof.graph.inputs(variables):
+        if isinstance(v, theano.gof.Constant):
+            hasher.update(np.ascontiguousarray(v.data).tobytes())
+    return hasher.hexdigest()
+
+
+def _load_cached_function(cache_path, shared):
+    """Loads a cached function and binds it to the given shared variables.
+
+    Returns `None` if there is no usable cache entry.
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        # Only the `FunctionMaker` (which holds the optimized graph) is
+        # cached, without re-running the optimizer when unpickling it.
+        with theano.change_flags(reoptimize_unpickled_function=False):
+            with open(cache_path, 'rb') as f:
+                maker, shared_indices = pickle.load(f)
+        # Link it against the containers of the current shared variables,
+        # the same way `theano.function` does with the ones it collects.
+        implicit_inputs = [i for i in maker.inputs if i.implicit]
+        for i, index in zip(implicit_inputs, shared_indices):
+            i.variable = shared[index]
+            i.value = shared[index].container
+        return maker.create([getattr(i, 'value', None) for i in maker.inputs])
+    except Exception as e:
+        warnings.warn('Could not load the cached function from "%s" (%s), '
+                      'compiling it again.' % (cache_path, e))
+        return None
+
+
+def _save_cached_function(function, cache_path, shared):
+    """Stores a compiled function in the function cache.
+    """
+    positions = dict((v, i) for i, v in enumerate(shared))
+    shared_indices = []
+    for v in function.get_shared():
+        if v not in positions:
+            # Shared variables that are not part of the user graph
+            # cannot be bound again when loading, do not cache.
+            return
+        shared_indices.append(positions[v])
+    cache_dir = os.path.dirname(cache_path)
+    tmp_path = '%s.%d.part' % (cache_path, os.getpid())
+    try:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((function.maker, shared_indices), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        if hasattr(os, 'replace'):
+            os.replace(tmp_path, cache_path)
+        else:
+            os.rename(tmp_path, cache_path)
+    except Exception as e:
+        warnings.warn('Could not store the compiled function in "%s" (%s).'
+                      % (cache_path, e))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
 def function(inputs, outputs, updates=[], **kwargs):
     """Return a :class:`callable object <theano.compile.function_module.Function>`
     that will calculate `outputs` from `inputs`.
+
+    Pass `shape_cache_size=n` to compile the function per combination
+    of input shapes, keeping the `n` most recently used ones
+    (see `Function`).
     """
     if len(kwargs) > 0:
         for key in kwargs.keys():
-            if not has_arg(theano.function, key, True):
+            if not (has_arg(theano.function, key, True) or
+                    has_arg(Function.__init__, key)):
                 msg = 'Invalid argument "%s" passed to K.function with Theano backend' % key
                 raise ValueError(msg)
     return Function(inputs, outputs, updates=updates, **kwargs)
@@ -2547,6 +2800,43 @@ def stop_gradient(variables):
         return theano.gradient.disconnected_grad(variables)
 
 
+def recompute_grad(function, inputs, variables=None):
+    """Calls `function`, recomputing it during the backward pass.
+
+    The graph of `function` is wrapped in a `theano.OpFromGraph`, whose
+    gradient recomputes the activations of the graph from its inputs
+    instead of keeping them (gradient checkpointing).
+
+    # Arguments
+        function: Function mapping a list of tensors to a list of
+            tensors. It must not use random streams or the learning
+            phase, and all the tensors it uses must either be
+            in `inputs` or be shared variables.
+        inputs: List of input tensors of `function`.
+        variables: Unused, the shared variables used by `function`
+            are found in its graph.
+
+    # Returns
+        The list of output tensors of `function`.
+    """
+    placeholders = []
+    for x in inputs:
+        y = x.type()
+        if hasattr(x, '_keras_shape'):
+            y._keras_shape = x._keras_shape
+        y._uses_learning_phase = getattr(x, '_uses_learning_phase', False)
+        placeholders.append(y)
+    # The gradients of the outputs are given to the inner graph as known
+    # gradients, which would replace (instead of adding to) the gradient
+    # of an output also used to compute another one: copy the outputs.
+    outputs = [T.tensor_copy(y) for y in function(placeholders)]
+    op = theano.OpFromGraph(placeholders, outputs, on_unused_input='ignore')
+    outputs = op(*inputs)
+    if not isinstance(outputs, (list, tuple)):
+        outputs = [outputs]
+    return list(outputs)
+
+
 # CONTROL FLOW
 
 def rnn(step_function, inputs, initial_states,
@@ -4014,6 +4304,26 @@ def bias_add(x, bias, data_format=None):
     return x
 
 
+def fused_bias_act(x, bias=None, activation=None):
+    """Adds a bias vector to the last axis of a tensor and activates it.
+
+    # Arguments
+        x: Tensor or variable.
+        bias: Bias vector with the size of the last axis of `x`
+            (or `None`).
+        activation: Elementwise function applied to the result
+            (or `None`).
+
+    # Returns
+        Output tensor.
+    """
+    if bias is not None:
+        x = x + bias
+    if activation is not None:
+        x = activation(x)
+    return x
+
+
 # RANDOMNESS
 def random_normal(shape, mean=0.0, stddev=1.0, dtype=None, seed=None):
     """Returns a tensor with normal distribution of values.
@@ -17,6 +17,8 @@ parser.add_argument('-caffemodel', type=str,
                     help='name of the .caffemodel file')
 parser.add_argument('-store_path', type=str, default='',
                     help='path to the folder where the Keras model will be stored (default: -load_path).')
+parser.add_argument('-cache_dir', type=str, default=None,
+                    help='folder where converted weights are cached, keyed by the hash of the .caffemodel')
 parser.add_argument('-debug', action='store_true', default=0,
                     help='use debug mode')
 
@@ -32,7 +34,7 @@ def main(args):
 
     print("Converting model...")
     model = convert.caffe_to_keras(args.load_path + '/' + args.prototxt, args.load_path + '/' + args.caffemodel,
-                                   debug=args.debug)
+                                   debug=args.debug, cache_dir=args.cache_dir)
     print("Finished converting model.")
 
     # Save converted model structure
@@ -1,18 +1,34 @@
+import os
+
 import numpy as np
 from google.protobuf import text_format
 
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
 from . import caffe_pb2 as caffe
 from .caffe_utils import *
 from .extra_layers import *
 from ..layers import *
 from ..models import Model
+from ..utils.data_utils import _hash_file
+
+# Field numbers of the repeated layer messages in `caffe.NetParameter`.
+_NET_LAYER_FIELD = 100  # V2 `layer`
+_NET_LAYERS_FIELD = 2  # V1 `layers`
 
 
-def caffe_to_keras(prototext, caffemodel, phase='train', debug=False):
+def caffe_to_keras(prototext, caffemodel, phase='train', debug=False,
+                   cache_dir=None):
     """Converts a Caffe Graph into a Keras Graph
         prototext: model description file in caffe
         caffemodel: stored weights file
         phase: train or test
+        cache_dir: if given, the converted weights are stored in this folder
+            as an HDF5 file keyed by the hash of `caffemodel`, and later
+            conversions of the same caffemodel just read that file.
 
         Usage:
             model = caffe_to_keras('VGG16.prototxt', 'VGG16_700iter.caffemodel')
@@ -42,29 +58,183 @@ def caffe_to_keras(prototext, caffemodel, phase='train', debug=False):
     model = create_model(layers,
                          0 if phase == 'train' else 1,
                          tuple(input_dim[1:]), debug)
-    params = caffe.NetParameter()
-    params.MergeFromString(open(caffemodel, 'rb').read())
-
-    if len(params.layers) != 0:
-        param_layers = params.layers[:]  # V1
-        v = 'V1'
-    elif len(params.layer) != 0:
-        param_layers = params.layer[:]  # V2
-        v = 'V2'
-    else:
-        raise Exception('could not load any layers from caffemodel')
 
     model.summary()
 
     print('')
     print("LOADING WEIGHTS")
-    weights = convert_weights(param_layers, v, debug)
+    weights = get_converted_weights(caffemodel, cache_dir, debug)
 
     load_weights(model, weights)
 
     return model
 
 
+def get_converted_weights(caffemodel, cache_dir=None, debug=False):
+    """Converts the weights of a .caffemodel, optionally through a cache.
+
+        caffemodel: stored weights file
+        cache_dir: if given, the converted weights are stored in this folder
+            as an HDF5 file keyed by the hash of `caffemodel` and reused on
+            later calls.
+
+        Returns a dictionary mapping layer names to lists of weight arrays.
+    """
+    if cache_dir is None:
+        weights = {}
+        for layer, v in iter_caffemodel_layers(caffemodel):
+            weights.update(convert_weights([layer], v, debug))
+        return weights
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    weights_path = os.path.join(
+        cache_dir, 'caffemodel_' + _hash_file(caffemodel) + '.h5')
+    if os.path.exists(weights_path):
+        print('Using cached weights from ' + weights_path)
+    else:
+        caffemodel_to_hdf5(caffemodel, weights_path, debug)
+    return load_converted_weights(weights_path)
+
+
+def iter_caffemodel_layers(caffemodel):
+    """Iterates over the layers stored in a .caffemodel file.
+
+    The file is parsed one layer message at a time instead of merging the
+    whole `NetParameter` in memory, so only a single layer's blobs are
+    alive at any time. As before, V1 `layers` are used if the file has
+    any, and V2 `layer` messages otherwise.
+
+        caffemodel: stored weights file
+
+        Yields tuples `(layer, version)` where `version` is 'V1' or 'V2'.
+    """
+    with open(caffemodel, 'rb') as f:
+        # First pass: only locate the layer messages, skipping their content.
+        positions = {_NET_LAYER_FIELD: [], _NET_LAYERS_FIELD: []}
+        while True:
+            tag = _read_varint(f)
+            if tag is None:
+                break
+            field_number, wire_type = tag >> 3, tag & 0x7
+            if wire_type == 0:
+                _read_varint(f)
+            elif wire_type == 1:
+                f.seek(8, os.SEEK_CUR)
+            elif wire_type == 5:
+                f.seek(4, os.SEEK_CUR)
+            elif wire_type == 2:
+                size = _read_varint(f)
+                if field_number in positions:
+                    positions[field_number].append((f.tell(), size))
+                f.seek(size, os.SEEK_CUR)
+            else:
+                raise Exception('could not parse caffemodel: unexpected '
+                                'wire type ' + str(wire_type))
+
+        if positions[_NET_LAYERS_FIELD]:
+            layer_class, v = caffe.V1LayerParameter, 'V1'
+            positions = positions[_NET_LAYERS_FIELD]
+        elif positions[_NET_LAYER_FIELD]:
+            layer_class, v = caffe.LayerParameter, 'V2'
+            positions = positions[_NET_LAYER_FIELD]
+        else:
+            raise Exception('could not load any layers from caffemodel')
+
+        for offset, size in positions:
+            f.seek(offset)
+            layer = layer_class()
+            layer.MergeFromString(f.read(size))
+            yield layer, v
+
+
+def _read_varint(f):
+    """Reads a protobuf base 128 varint, returns None at end of file.
+    """
+    result = 0
+    shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            if shift == 0:
+                return None
+            raise Exception('could not parse caffemodel: truncated file')
+        byte = bytearray(byte)[0]
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result
+        shift += 7
+
+
+def caffemodel_to_hdf5(caffemodel, filepath, debug=False):
+    """Converts the weights of a .caffemodel into an HDF5 weights file.
+
+    Layers are converted and written one at a time, following the layout
+    of `Model.save_weights` (a group per layer with a `weight_names`
+    attribute). The converted weights can be read back with
+    `load_converted_weights`.
+
+        caffemodel: stored weights file
+        filepath: destination HDF5 file
+    """
+    if h5py is None:
+        raise ImportError('`caffemodel_to_hdf5` requires h5py.')
+    from ..engine.saving import save_attributes_to_hdf5_group
+
+    # Write to a temporary file first so that an interrupted conversion
+    # never leaves a truncated file behind (e.g. in the conversion cache).
+    tmp_filepath = filepath + '.part'
+    try:
+        layer_names = []
+        with h5py.File(tmp_filepath, 'w') as f:
+            for layer, v in iter_caffemodel_layers(caffemodel):
+                for name, values in convert_weights([layer], v, debug).items():
+                    if name in f:
+                        # Same as in `convert_weights`: the last one wins.
+                        del f[name]
+                    else:
+                        layer_names.append(name.encode('utf8'))
+                    g = f.create_group(name)
+                    weight_names = []
+                    for i, val in enumerate(values):
+                        weight_name = 'param_' + str(i)
+                        g.create_dataset(weight_name, data=val)
+                        weight_names.append(weight_name.encode('utf8'))
+                    save_attributes_to_hdf5_group(g, 'weight_names', weight_names)
+            save_attributes_to_hdf5_group(f, 'layer_names', layer_names)
+        if hasattr(os, 'replace'):
+            os.replace(tmp_filepath, filepath)
+        else:
+            # Python 2: `os.rename` fails on Windows if the target exists.
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            os.rename(tmp_filepath, filepath)
+    finally:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+    return filepath
+
+
+def load_converted_weights(filepath):
+    """Reads an HDF5 file written by `caffemodel_to_hdf5`.
+
+        filepath: HDF5 weights file
+
+        Returns a dictionary mapping layer names to lists of weight arrays.
+    """
+    if h5py is None:
+        raise ImportError('`load_converted_weights` requires h5py.')
+    from ..engine.saving import load_attributes_from_hdf5_group
+
+    weights = {}
+    with h5py.File(filepath, 'r') as f:
+        for name in load_attributes_from_hdf5_group(f, 'layer_names'):
+            g = f[name]
+            weight_names = load_attributes_from_hdf5_group(g, 'weight_names')
+            weights[name] = [np.asarray(g[w]) for w in weight_names]
+    return weights
+
+
 def preprocessPrototxt(prototxt, debug=False):
     p = open(prototxt).read().split('\n')
 
@@ -401,10 +571,18 @@ def create_model(layers, phase, input_dim, debug=False):
 
 
 def rot90(W):
-    for i in range(W.shape[0]):
-        for j in range(W.shape[1]):
-            W[i, j] = np.rot90(W[i, j], 2)
-    return W
+    """Rotates by 180 degrees every (height, width) kernel of W.
+    """
+    return np.ascontiguousarray(W[:, :, ::-1, ::-1])
+
+
+def blob_to_array(blob, shape=None):
+    """Converts the data of a caffe blob into a float32 numpy array.
+    """
+    data = np.fromiter(blob.data, dtype=np.float32, count=len(blob.data))
+    if shape is not None:
+        data = data.reshape(shape)
+    return data
 
 
 def convert_weights(param_layers, v='V1', debug=False):
@@ -434,10 +612,10 @@ def convert_weights(param_layers, v='V1', debug=False):
             else:
                 raise RuntimeError('incorrect caffemodel version "' + v + '"')
 
-            weights_p = np.array(blobs[0].data).reshape(nb_filter, stack_size, nb_col, nb_row)[0, 0, :, :]
-            weights_p = weights_p.T  # need to swapaxes here, hence transpose. See comment in conv
-            weights_b = np.array(blobs[1].data)
-            layer_weights = [weights_p.astype(dtype=np.float32), weights_b.astype(dtype=np.float32)]
+            weights_p = blob_to_array(blobs[0], (nb_filter, stack_size, nb_col, nb_row))[0, 0, :, :]
+            weights_p = np.ascontiguousarray(weights_p.T)  # need to swapaxes here, hence transpose. See comment in conv
+            weights_b = blob_to_array(blobs[1])
+            layer_weights = [weights_p, weights_b]
 
             weights[layer.name] = layer_weights
 
@@ -449,11 +627,11 @@ def convert_weights(param_layers, v='V1', debug=False):
                 raise NotImplementedError(
                     'Conversion on layer type "' + typ + '"not implemented forcaffemodel version "' + v + '"')
 
-            weights_mean = np.array(blobs[0].data)
-            weights_std_dev = np.array(blobs[1].data)
+            weights_mean = blob_to_array(blobs[0])
+            weights_std_dev = blob_to_array(blobs[1])
 
-            weights[layer.name] = [np.ones(nb_kernels), np.zeros(nb_kernels), weights_mean.astype(dtype=np.float32),
-                                   weights_std_dev.astype(dtype=np.float32)]
+            weights[layer.name] = [np.ones(nb_kernels, dtype=np.float32), np.zeros(nb_kernels, dtype=np.float32), weights_mean,
+                                   weights_std_dev]
 
         elif typ == 'scale':
             blobs = layer.blobs
@@ -465,10 +643,10 @@ def convert_weights(param_layers, v='V1', debug=False):
                 raise NotImplementedError(
                     'Conversion on layer type "' + typ + '"not implemented forcaffemodel version "' + v + '"')
 
-            weights_gamma = np.array(blobs[0].data)
-            weights_beta = np.array(blobs[1].data)
+            weights_gamma = blob_to_array(blobs[0])
+            weights_beta = blob_to_array(blobs[1])
 
-            weights[layer.name] = [weights_gamma.astype(dtype=np.float32), weights_beta.astype(dtype=np.float32)]
+            weights[layer.name] = [weights_gamma, weights_beta]
 
         elif typ == 'convolution' or typ == 'deconvolution':
             blobs = layer.blobs
@@ -497,12 +675,10 @@ def convert_weights(param_layers, v='V1', debug=False):
             group = layer.convolution_param.group
             stack_size = temp_stack_size * group
 
-            weights_p = np.zeros((nb_filter, stack_size, nb_col, nb_row))
-
             if layer.convolution_param.bias_term:
-                weights_b = np.array(blobs[1].data)
+                weights_b = blob_to_array(blobs[1])
             else:
-                weights_b = np.zeros((nb_filter,))
+                weights_b = np.zeros((nb_filter,), dtype=np.float32)
 
             group_data_size = len(blobs[0].data) // group
             stacks_size_per_group = stack_size // group
@@ -517,18 +693,20 @@ def convert_weights(param_layers, v='V1', debug=False):
                 print ("groups")
                 print (group)
 
-            for i in range(group):
-                group_weights = weights_p[i * nb_filter_per_group: (i + 1) * nb_filter_per_group, i * stacks_size_per_group: (i + 1) * stacks_size_per_group, :, :]
-                group_weights[:] = np.array(blobs[0].data[i * group_data_size: (i + 1) * group_data_size]).reshape(
-                    group_weights.shape)
+            blob_data = blob_to_array(blobs[0])
+            if group == 1:
+                weights_p = blob_data.reshape((nb_filter, stack_size, nb_col, nb_row))
+            else:
+                weights_p = np.zeros((nb_filter, stack_size, nb_col, nb_row), dtype=np.float32)
+                for i in range(group):
+                    group_weights = weights_p[i * nb_filter_per_group: (i + 1) * nb_filter_per_group, i * stacks_size_per_group: (i + 1) * stacks_size_per_group, :, :]
+                    group_weights[:] = blob_data[i * group_data_size: (i + 1) * group_data_size].reshape(
+                        group_weights.shape)
 
             # caffe, unlike theano, does correlation not convolution. We need to flip the weights 180 deg
             weights_p = rot90(weights_p)
 
-            if weights_b is not None:
-                layer_weights = [weights_p.astype(dtype=np.float32), weights_b.astype(dtype=np.float32)]
-            else:
-                layer_weights = [weights_p.astype(dtype=np.float32)]
+            layer_weights = [weights_p, weights_b]
 
             weights[layer.name] = layer_weights
 
@@ -537,6 +715,6 @@ def convert_weights(param_layers, v='V1', debug=False):
 
 def load_weights(model, weights):
     for layer in model.layers:
-        if weights in layer.name:
+        if layer.name in weights:
             model.get_layer(layer.name).set_weights(weights[layer.name])
             print ("Copied wts for layer:", layer.name)
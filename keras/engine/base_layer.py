@@ -19,6 +19,40 @@ from ..utils.generic_utils import is_all_none
 from ..legacy import interfaces
 
 
+# Version of the layer graph. It is incremented by every change
+# that can modify the weights, losses or updates collected from
+# layers (new weights, losses, updates or nodes, changes of
+# `trainable` or `stateful`, layers added to a network),
+# so that networks can cache these collections.
+_GRAPH_VERSION = 0
+
+# Layer attributes whose assignment increments the graph version.
+_GRAPH_ATTRIBUTES = frozenset(['trainable', 'stateful',
+                               '_trainable_weights', '_non_trainable_weights',
+                               '_losses', '_updates', '_layers'])
+
+
+def get_graph_version():
+    """Returns the current version of the layer graph.
+
+    # Returns
+        An integer, incremented by every change that can modify
+        the weights, losses or updates collected from layers.
+    """
+    return _GRAPH_VERSION
+
+
+def invalidate_graph_caches():
+    """Increments the layer graph version.
+
+    Call this after mutating the weight, loss or update lists
+    of a layer in place, to invalidate the collections cached
+    by the networks that contain it.
+    """
+    global _GRAPH_VERSION
+    _GRAPH_VERSION += 1
+
+
 class Layer(object):
     """Abstract base layer class.
 
@@ -160,6 +194,11 @@ class Layer(object):
         else:
             self._initial_weights = None
 
+    def __setattr__(self, name, value):
+        if name in _GRAPH_ATTRIBUTES:
+            invalidate_graph_caches()
+        super(Layer, self).__setattr__(name, value)
+
     @staticmethod
     def _node_key(layer, node_index):
         """Converts a layer and its index to a unique (immutable type) name.
@@ -257,6 +296,7 @@ class Layer(object):
             self._trainable_weights.append(weight)
         else:
             self._non_trainable_weights.append(weight)
+        invalidate_graph_caches()
         return weight
 
     def assert_input_compatibility(self, inputs):
@@ -964,6 +1004,7 @@ class Layer(object):
         if inputs_hash not in self._per_input_losses:
             self._per_input_losses[inputs_hash] = []
         self._per_input_losses[inputs_hash] += losses
+        invalidate_graph_caches()
 
     def add_update(self, updates, inputs=None):
         """Adds updates to the layer.
@@ -996,6 +1037,7 @@ class Layer(object):
         if inputs_hash not in self._per_input_updates:
             self._per_input_updates[inputs_hash] = []
         self._per_input_updates[inputs_hash] += updates
+        invalidate_graph_caches()
 
     def get_updates_for(self, inputs):
         if not self.trainable and not self.stateful:
@@ -1270,11 +1312,16 @@ class Node(object):
         # Optional keyword arguments to layer's `call`.
         self.arguments = arguments
 
+        # Index of this node in `outbound_layer._inbound_nodes`,
+        # so that graph traversals never have to search for it.
+        self.node_index = len(outbound_layer._inbound_nodes)
+
         # Add nodes to all layers involved.
         for layer in inbound_layers:
             if layer is not None:
                 layer._outbound_nodes.append(self)
         outbound_layer._inbound_nodes.append(self)
+        invalidate_graph_caches()
 
     def get_config(self):
         inbound_names = []
@@ -10,11 +10,13 @@ import yaml
 import warnings
 import copy
 import os
+import collections
 from six.moves import zip
 
 from . import saving
 from .base_layer import Layer
 from .base_layer import Node
+from .base_layer import get_graph_version
 from .input_layer import InputLayer
 from .. import backend as K
 from ..utils.io_utils import ask_to_proceed_with_overwrite
@@ -209,6 +211,9 @@ class Network(Layer):
         self._output_mask_cache = {}
         self._output_tensor_cache = {}
         self._output_shape_cache = {}
+        # Flat list of the layer calls of `run_internal_graph`,
+        # built on its first run (see `_get_execution_plan`).
+        self._execution_plan = None
 
         # Build self._output_layers:
         for x in self.outputs:
@@ -357,6 +362,25 @@ class Network(Layer):
 
         raise ValueError('No such layer: ' + name)
 
+    def _get_cached(self, key, compute):
+        """Returns a collection cached until the layer graph changes.
+
+        # Arguments
+            key: String, name of the collection.
+            compute: Function computing the collection.
+
+        # Returns
+            A new list with the elements of the collection.
+        """
+        version = get_graph_version()
+        cache = self.__dict__.get('_collections_cache')
+        if cache is None or cache['version'] != version:
+            cache = {'version': version}
+            self._collections_cache = cache
+        if key not in cache:
+            cache[key] = compute()
+        return list(cache[key])
+
     @property
     def updates(self):
         """Retrieves the model's updates.
@@ -369,6 +393,9 @@ class Network(Layer):
         # Returns
             A list of update ops.
         """
+        return self._get_cached('updates', self._collect_updates)
+
+    def _collect_updates(self):
         if not self.trainable and not self.stateful:
             return []
         updates = []
@@ -401,6 +428,9 @@ class Network(Layer):
         # Returns
             A list of loss tensors.
         """
+        return self._get_cached('losses', self._collect_losses)
+
+    def _collect_losses(self):
         losses = []
         for layer in self.layers:
             if hasattr(layer, 'losses'):
@@ -453,6 +483,9 @@ class Network(Layer):
         # Returns
             A list of update ops.
         """
+        return self._get_cached('state_updates', self._collect_state_updates)
+
+    def _collect_state_updates(self):
         state_updates = []
         for layer in self.layers:
             if layer.stateful:
@@ -461,6 +494,10 @@ class Network(Layer):
 
     @property
     def trainable_weights(self):
+        return self._get_cached('trainable_weights',
+                                self._collect_trainable_weights)
+
+    def _collect_trainable_weights(self):
         if not self.trainable:
             return []
         weights = []
@@ -470,6 +507,10 @@ class Network(Layer):
 
     @property
     def non_trainable_weights(self):
+        return self._get_cached('non_trainable_weights',
+                                self._collect_non_trainable_weights)
+
+    def _collect_non_trainable_weights(self):
         weights = []
         for layer in self.layers:
             weights += layer.non_trainable_weights
@@ -592,7 +633,7 @@ class Network(Layer):
                              str(input_shape) + ': model has ' +
                              str(len(self._input_layers)) + ' tensor inputs.')
 
-        cache_key = ', '.join([str(x) for x in input_shapes])
+        cache_key = _shape_cache_key(input_shapes)
         if cache_key in self._output_shape_cache:
             output_shapes = self._output_shape_cache[cache_key]
             if isinstance(output_shapes, list):
@@ -600,60 +641,51 @@ class Network(Layer):
             return output_shapes
         else:
             # Bad luck, we have to run the graph manually.
+            # Maps `(layer, node_index, tensor_index)` to output shapes.
             layers_to_output_shapes = {}
             for i in range(len(input_shapes)):
                 layer = self._input_layers[i]
                 input_shape = input_shapes[i]
                 # It's an input layer: compute_output_shape is identity,
                 # and there is only one node and one tensor output.
-                shape_key = layer.name + '_0_0'
-                layers_to_output_shapes[shape_key] = input_shape
+                layers_to_output_shapes[(layer, 0, 0)] = input_shape
 
             depth_keys = list(self._nodes_by_depth.keys())
             depth_keys.sort(reverse=True)
             # Iterate over nodes, by depth level.
             if len(depth_keys) > 1:
+                input_layers = set(self._input_layers)
                 for depth in depth_keys:
                     nodes = self._nodes_by_depth[depth]
                     for node in nodes:
                         # This is always a single layer, never a list.
                         layer = node.outbound_layer
-                        if layer in self._input_layers:
+                        if layer in input_layers:
                             # We've already covered the input layers
                             # a few lines above.
                             continue
                         # Potentially redundant list,
                         # same size of node.input_tensors.
                         input_shapes = []
-                        for j in range(len(node.inbound_layers)):
-                            inbound_layer = node.inbound_layers[j]
-                            node_index = node.node_indices[j]
-                            tensor_index = node.tensor_indices[j]
-                            shape_key = inbound_layer.name
-                            shape_key += '_%s_%s' % (node_index, tensor_index)
-                            input_shape = layers_to_output_shapes[shape_key]
-                            input_shapes.append(input_shape)
+                        for inbound_layer, node_index, tensor_index in zip(
+                                node.inbound_layers,
+                                node.node_indices,
+                                node.tensor_indices):
+                            input_shapes.append(layers_to_output_shapes[
+                                (inbound_layer, node_index, tensor_index)])
 
                         output_shape = layer.compute_output_shape(
                             unpack_singleton(input_shapes))
 
                         output_shapes = to_list(output_shape)
-                        node_index = layer._inbound_nodes.index(node)
-                        for j in range(len(output_shapes)):
-                            shape_key = layer.name + '_%s_%s' % (node_index, j)
-                            layers_to_output_shapes[shape_key] = output_shapes[j]
+                        for j, shape in enumerate(output_shapes):
+                            layers_to_output_shapes[
+                                (layer, node.node_index, j)] = shape
 
             # Read final output shapes from layers_to_output_shapes.
             output_shapes = []
-            output_shape_keys = []
-            for i in range(len(self._output_layers)):
-                layer = self._output_layers[i]
-                node_index = self._output_coordinates[i][1]
-                tensor_index = self._output_coordinates[i][2]
-                shape_key = layer.name + '_%s_%s' % (node_index, tensor_index)
-                output_shape_keys.append(shape_key)
-
-            for i, key in enumerate(output_shape_keys):
+            for layer, node_index, tensor_index in self._output_coordinates:
+                key = (layer, node_index, tensor_index)
                 assert key in layers_to_output_shapes
                 output_shapes.append(layers_to_output_shapes[key])
             # Store in cache.
@@ -662,6 +694,116 @@ class Network(Layer):
                 return unpack_singleton(output_shapes)
             return output_shapes
 
+    def _get_execution_plan(self):
+        """Returns the layer calls made by `run_internal_graph`, in order.
+
+        The plan only depends on the topology of the network, so it is
+        built once and replayed every time the network is called.
+        Tensors are referred to by their position (slot) in a flat
+        list of computed values, the network inputs taking the first
+        slots.
+
+        # Returns
+            A tuple `(steps, output_slots, num_slots)`, where `steps`
+            is a list of `(node, input_slots, output_slots, mask_arg)`
+            tuples (`mask_arg` tells whether the layer `call` accepts
+            a `mask` argument) and `output_slots` lists the slots of
+            the network outputs (None for outputs that cannot be
+            computed from the inputs).
+        """
+        if self._execution_plan is not None:
+            return self._execution_plan
+        # Maps tensor ids to the slot of their last computed value
+        # (e.g. the output of an input layer is its input tensor).
+        slots = {}
+        num_slots = 0
+        for x in self.inputs:
+            slots[id(x)] = num_slots
+            num_slots += 1
+        steps = []
+        depth_keys = list(self._nodes_by_depth.keys())
+        depth_keys.sort(reverse=True)
+        for depth in depth_keys:
+            for node in self._nodes_by_depth[depth]:
+                # Only call the layers whose input tensors can all be
+                # computed from the network inputs.
+                if not all(id(x) in slots for x in node.input_tensors):
+                    continue
+                input_slots = [slots[id(x)] for x in node.input_tensors]
+                output_slots = []
+                for x in node.output_tensors:
+                    slots[id(x)] = num_slots
+                    output_slots.append(num_slots)
+                    num_slots += 1
+                layer = node.outbound_layer
+                steps.append((node, input_slots, output_slots,
+                              has_arg(layer.call, 'mask')))
+        output_slots = [slots.get(id(x)) for x in self.outputs]
+        self._execution_plan = (steps, output_slots, num_slots)
+        return self._execution_plan
+
+    def _call_node(self, node, computed_data, mask_arg):
+        """Calls the layer of a node on computed tensors.
+
+        # Arguments
+            node: `Node` whose layer is called, with its arguments.
+            computed_data: List of `(tensor, mask)` tuples, the inputs
+                of the call.
+            mask_arg: Whether the layer `call` accepts a `mask` argument.
+
+        # Returns
+            A tuple `(computed_tensors, output_tensors, output_masks)`
+            of lists, `computed_tensors` being the input tensors.
+
+        # Raises
+            Exception: if the layer does not return one mask
+                per output tensor.
+        """
+        # This is always a single layer, never a list.
+        layer = node.outbound_layer
+        if node.arguments:
+            kwargs = dict(node.arguments)
+        else:
+            kwargs = {}
+        if len(computed_data) == 1:
+            computed_tensor, computed_mask = computed_data[0]
+            if mask_arg:
+                if 'mask' not in kwargs:
+                    kwargs['mask'] = computed_mask
+            output_tensors = to_list(
+                layer.call(computed_tensor, **kwargs))
+            output_masks = layer.compute_mask(computed_tensor,
+                                              computed_mask)
+            if output_masks is None:
+                output_masks = [None for _ in output_tensors]
+            else:
+                output_masks = to_list(output_masks)
+            computed_tensors = [computed_tensor]
+
+            # computed_masks might be used in the future.
+            computed_masks = [computed_mask]
+        else:
+            computed_tensors = [x[0] for x in computed_data]
+            computed_masks = [x[1] for x in computed_data]
+            if mask_arg:
+                if 'mask' not in kwargs:
+                    kwargs['mask'] = computed_masks
+            output_tensors = to_list(
+                layer.call(computed_tensors, **kwargs))
+            output_masks = layer.compute_mask(computed_tensors,
+                                              computed_masks)
+            if output_masks is None:
+                output_masks = [None for _ in output_tensors]
+            else:
+                output_masks = to_list(output_masks)
+        if len(output_masks) != len(output_tensors):
+            raise Exception(
+                'Layers should have equal number of output tensors '
+                'and output masks. Layer ' + str(layer.name) + ' has'
+                ' ' + str(len(output_tensors)) + ' output tensors '
+                'and ' + str(len(output_masks)) + ' output masks.')
+        return computed_tensors, output_tensors, output_masks
+
     def run_internal_graph(self, inputs, masks=None):
         """Computes output tensors for new inputs.
 
@@ -679,124 +821,70 @@ class Network(Layer):
         if masks is None:
             masks = [None for _ in range(len(inputs))]
 
-        # Dictionary mapping reference tensors to tuples
-        # (computed tensor, compute mask)
-        # we assume a 1:1 mapping from tensor to mask
+        steps, plan_output_slots, num_slots = self._get_execution_plan()
+        # Computed (tensor, mask) tuples, indexed by plan slot.
+        # We assume a 1:1 mapping from tensor to mask.
         # TODO: raise exception when a `.compute_mask()` call
         # does not return a list the same size as `call`
-        tensor_map = {}
-        for x, y, mask in zip(self.inputs, inputs, masks):
-            tensor_map[str(id(x))] = (y, mask)
+        computed = [None] * num_slots
+        for i, (y, mask) in enumerate(zip(inputs, masks)):
+            computed[i] = (y, mask)
 
-        depth_keys = list(self._nodes_by_depth.keys())
-        depth_keys.sort(reverse=True)
-        for depth in depth_keys:
-            nodes = self._nodes_by_depth[depth]
-            for node in nodes:
-                # This is always a single layer, never a list.
-                layer = node.outbound_layer
-                reference_input_tensors = node.input_tensors
-                reference_output_tensors = node.output_tensors
-
-                # If all previous input tensors are available in tensor_map,
-                # then call node.inbound_layer on them.
-                computed_data = []  # List of tuples (input, mask).
-                for x in reference_input_tensors:
-                    if str(id(x)) in tensor_map:
-                        computed_data.append(tensor_map[str(id(x))])
-
-                if len(computed_data) == len(reference_input_tensors):
-                    # call layer
-                    with K.name_scope(layer.name):
-                        if node.arguments:
-                            kwargs = node.arguments
-                        else:
-                            kwargs = {}
-                        if len(computed_data) == 1:
-                            computed_tensor, computed_mask = computed_data[0]
-                            if has_arg(layer.call, 'mask'):
-                                if 'mask' not in kwargs:
-                                    kwargs['mask'] = computed_mask
-                            output_tensors = to_list(
-                                layer.call(computed_tensor, **kwargs))
-                            output_masks = layer.compute_mask(computed_tensor,
-                                                              computed_mask)
-                            if output_masks is None:
-                                output_masks = [None for _ in output_tensors]
-                            else:
-                                output_masks = to_list(output_masks)
-                            computed_tensors = [computed_tensor]
-
-                            # computed_masks might be used in the future.
-                            computed_masks = [computed_mask]
-                        else:
-                            computed_tensors = [x[0] for x in computed_data]
-                            computed_masks = [x[1] for x in computed_data]
-                            if has_arg(layer.call, 'mask'):
-                                if 'mask' not in kwargs:
-                                    kwargs['mask'] = computed_masks
-                            output_tensors = to_list(
-                                layer.call(computed_tensors, **kwargs))
-                            output_masks = layer.compute_mask(computed_tensors,
-                                                              computed_masks)
-                            if output_masks is None:
-                                output_masks = [None for _ in output_tensors]
-                            else:
-                                output_masks = to_list(output_masks)
-                        # Apply activity regularizer if any:
-                        if (hasattr(layer, 'activity_regularizer') and
-                                layer.activity_regularizer is not None):
-                            with K.name_scope('activity_regularizer'):
-                                regularization_losses = [
-                                    layer.activity_regularizer(x)
-                                    for x in output_tensors]
-                            layer.add_loss(regularization_losses,
-                                           inputs=computed_tensors)
-
-                        if len(output_masks) != len(output_tensors):
-                            raise Exception(
-                                'Layers should have equal number of output tensors '
-                                'and output masks. Layer ' + str(layer.name) + ' has'
-                                ' ' + str(len(output_tensors)) + ' output tensors '
-                                'and ' + str(len(output_masks)) + ' output masks.')
-                    # Update model updates and losses:
-                    # Keep track of updates that depend on the inputs
-                    # (e.g. BN updates).
-                    self.add_update(layer.get_updates_for(computed_tensors), inputs)
-                    # Keep track of unconditional updates (e.g. a counter).
-                    self.add_update(layer.get_updates_for(None), None)
-                    # Keep track of losses that depend on the inputs
-                    # (e.g. activity regularizers).
-                    self.add_loss(layer.get_losses_for(computed_tensors), inputs)
-                    # Keep track of unconditional losses
-                    # (e.g. weight regularizers).
-                    self.add_loss(layer.get_losses_for(None), None)
-
-                    # Update _keras_shape.
-                    if all([hasattr(x, '_keras_shape') for x in computed_tensors]):
-                        input_shapes = unpack_singleton(
-                            [x._keras_shape for x in computed_tensors])
-                        shapes = to_list(layer.compute_output_shape(input_shapes))
-                        uses_learning_phase = any(
-                            [x._uses_learning_phase for x in computed_tensors])
-
-                        for x, s in zip(output_tensors, shapes):
-                            x._keras_shape = s
-                            _u = getattr(x, '_uses_learning_phase', False)
-                            x._uses_learning_phase = _u or uses_learning_phase
-
-                    # Update tensor_map.
-                    for x, y, mask in zip(reference_output_tensors,
-                                          output_tensors,
-                                          output_masks):
-                        tensor_map[str(id(x))] = (y, mask)
+        for node, input_slots, output_slots, mask_arg in steps:
+            # This is always a single layer, never a list.
+            layer = node.outbound_layer
+            computed_data = [computed[i] for i in input_slots]
+
+            # call layer
+            with K.name_scope(layer.name):
+                computed_tensors, output_tensors, output_masks = (
+                    self._call_node(node, computed_data, mask_arg))
+                # Apply activity regularizer if any:
+                if (hasattr(layer, 'activity_regularizer') and
+                        layer.activity_regularizer is not None):
+                    with K.name_scope('activity_regularizer'):
+                        regularization_losses = [
+                            layer.activity_regularizer(x)
+                            for x in output_tensors]
+                    layer.add_loss(regularization_losses,
+                                   inputs=computed_tensors)
+
+            # Update model updates and losses:
+            # Keep track of updates that depend on the inputs
+            # (e.g. BN updates).
+            self.add_update(layer.get_updates_for(computed_tensors), inputs)
+            # Keep track of unconditional updates (e.g. a counter).
+            self.add_update(layer.get_updates_for(None), None)
+            # Keep track of losses that depend on the inputs
+            # (e.g. activity regularizers).
+            self.add_loss(layer.get_losses_for(computed_tensors), inputs)
+            # Keep track of unconditional losses
+            # (e.g. weight regularizers).
+            self.add_loss(layer.get_losses_for(None), None)
+
+            # Update _keras_shape.
+            if all([hasattr(x, '_keras_shape') for x in computed_tensors]):
+                input_shapes = unpack_singleton(
+                    [x._keras_shape for x in computed_tensors])
+                shapes = to_list(layer.compute_output_shape(input_shapes))
+                uses_learning_phase = any(
+                    [x._uses_learning_phase for x in computed_tensors])
+
+                for x, s in zip(output_tensors, shapes):
+                    x._keras_shape = s
+                    _u = getattr(x, '_uses_learning_phase', False)
+                    x._uses_learning_phase = _u or uses_learning_phase
+
+            # Store the computed tensors and masks.
+            for i, y, mask in zip(output_slots, output_tensors, output_masks):
+                computed[i] = (y, mask)
 
         output_tensors = []
         output_masks = []
         output_shapes = []
-        for x in self.outputs:
-            assert str(id(x)) in tensor_map, 'Could not compute output ' + str(x)
-            tensor, mask = tensor_map[str(id(x))]
+        for x, i in zip(self.outputs, plan_output_slots):
+            assert i is not None, 'Could not compute output ' + str(x)
+            tensor, mask = computed[i]
             if hasattr(tensor, '_keras_shape') and output_shapes is not None:
                 shape = tensor._keras_shape
                 output_shapes.append(shape)
@@ -818,12 +906,150 @@ class Network(Layer):
 
         if output_shapes is not None:
             input_shapes = [x._keras_shape for x in inputs]
-            cache_key = ', '.join([str(x) for x in input_shapes])
+            cache_key = _shape_cache_key(input_shapes)
 
             output_shapes = unpack_singleton(output_shapes)
             self._output_shape_cache[cache_key] = output_shapes
         return output_tensors, output_masks, output_shapes
 
+    def checkpointed_outputs(self, num_segments):
+        """Recomputes the outputs of the network with gradient checkpointing.
+
+        The layer calls of the network are split into `num_segments`
+        segments of consecutive calls. The outputs of each segment are
+        computed with `K.recompute_grad`, so that the activations inside
+        a segment are not kept for the backward pass but recomputed from
+        the segment inputs when the gradients are computed. With about
+        `sqrt(n)` segments for `n` layers, the activation memory of
+        training grows as `O(sqrt(n))` for about one more forward pass
+        of compute.
+
+        Layer calls that cannot be recomputed identically are run
+        normally, between segments: calls of stateful layers or of layers
+        with updates (e.g. `BatchNormalization`) and calls that depend on
+        the learning phase themselves (e.g. `Dropout`, whose random mask
+        would change).
+
+        # Arguments
+            num_segments: Number of segments.
+
+        # Returns
+            List of output tensors, with the same values as `outputs`.
+
+        # Raises
+            ValueError: if `num_segments` is not a positive integer.
+        """
+        if not isinstance(num_segments, int) or num_segments < 1:
+            raise ValueError('The number of checkpoint segments should be '
+                             'a positive integer, got: ' + str(num_segments))
+        steps, plan_output_slots, num_slots = self._get_execution_plan()
+        # Index of the last step using each slot; the outputs of the
+        # network are used after all the steps.
+        last_use = {}
+        for index, (_, input_slots, _, _) in enumerate(steps):
+            for i in input_slots:
+                last_use[i] = index
+        for i in plan_output_slots:
+            last_use[i] = len(steps)
+
+        computed = [None] * num_slots
+        for i, x in enumerate(self.inputs):
+            computed[i] = (x, None)
+        segment_length = -(-len(steps) // num_segments)
+        for start in range(0, len(steps), segment_length):
+            segment = []
+            for index in range(start, min(start + segment_length,
+                                          len(steps))):
+                if _is_recomputable(steps[index][0]):
+                    segment.append(steps[index])
+                    continue
+                self._checkpoint_segment(segment, computed, last_use,
+                                         index - 1)
+                self._replay_steps([steps[index]], computed)
+                segment = []
+            self._checkpoint_segment(segment, computed, last_use, index)
+        return [computed[i][0] for i in plan_output_slots]
+
+    def _checkpoint_segment(self, segment, computed, last_use, end):
+        """Computes the outputs of a segment of steps with recomputation.
+
+        # Arguments
+            segment: List of consecutive steps of the execution plan.
+            computed: List of computed `(tensor, mask)` tuples, indexed
+                by slot, updated with the outputs of the segment.
+            last_use: Dictionary mapping slots to the index of the last
+                step using them.
+            end: Index of the last step of the segment.
+        """
+        if not segment:
+            return
+        produced = set()
+        input_slots = []
+        for _, step_inputs, step_outputs, _ in segment:
+            for i in step_inputs:
+                if i not in produced and i not in input_slots:
+                    input_slots.append(i)
+            produced.update(step_outputs)
+        # Run the segment once normally: the masks (and the outputs that
+        # are not differentiable) are taken from this run.
+        self._replay_steps(segment, computed)
+        output_slots = [i for i in sorted(produced)
+                        if last_use.get(i, -1) > end and
+                        K.dtype(computed[i][0]).startswith('float')]
+        if not output_slots:
+            return
+        mask_slots = [i for i in input_slots if computed[i][1] is not None]
+        variables = []
+        for node, _, _, _ in segment:
+            for weight in node.outbound_layer.trainable_weights:
+                if weight not in variables:
+                    variables.append(weight)
+
+        def segment_function(tensors):
+            replayed = {}
+            for i, x in zip(input_slots, tensors):
+                replayed[i] = (x, None)
+            for i, mask in zip(mask_slots, tensors[len(input_slots):]):
+                replayed[i] = (replayed[i][0], mask)
+            self._replay_steps(segment, replayed)
+            return [replayed[i][0] for i in output_slots]
+
+        outputs = K.recompute_grad(
+            segment_function,
+            [computed[i][0] for i in input_slots] +
+            [computed[i][1] for i in mask_slots],
+            variables)
+        for i, y in zip(output_slots, outputs):
+            x, mask = computed[i]
+            if hasattr(x, '_keras_shape'):
+                y._keras_shape = x._keras_shape
+            y._uses_learning_phase = getattr(x, '_uses_learning_phase',
+                                             False)
+            computed[i] = (y, mask)
+
+    def _replay_steps(self, steps, computed):
+        """Calls the layers of steps of the execution plan.
+
+        Unlike `run_internal_graph`, no losses or updates are collected.
+
+        # Arguments
+            steps: List of steps of the execution plan.
+            computed: List (or dictionary) of computed `(tensor, mask)`
+                tuples, indexed by slot, updated with the outputs.
+        """
+        for node, input_slots, output_slots, mask_arg in steps:
+            computed_data = [computed[i] for i in input_slots]
+            with K.name_scope(node.outbound_layer.name):
+                _, output_tensors, output_masks = self._call_node(
+                    node, computed_data, mask_arg)
+            for i, x, y, mask in zip(output_slots, node.output_tensors,
+                                     output_tensors, output_masks):
+                if hasattr(x, '_keras_shape'):
+                    y._keras_shape = x._keras_shape
+                y._uses_learning_phase = getattr(x, '_uses_learning_phase',
+                                                 False)
+                computed[i] = (y, mask)
+
     def get_config(self):
         if not self._is_graph_network:
             # Subclassed networks are not serializable
@@ -946,25 +1172,41 @@ class Network(Layer):
         # Raises
             ValueError: In case of improperly formatted config dict.
         """
+        from ..layers import deserialize as deserialize_layer
+
+        config = _expand_layer_configs(config)
+
         # Layer instances created during
         # the graph reconstruction process
         created_layers = {}
 
-        # Dictionary mapping layer instances to
-        # node data that specifies a layer call.
-        # It acts as a queue that maintains any unprocessed
-        # layer call until it becomes possible to process it
-        # (i.e. until the input tensors to the call all exist).
+        # Dictionary mapping layer instances to the queue of
+        # node data that specifies their layer calls, in call order.
+        # Only the head of a queue may be processed, so that the
+        # recreated nodes keep their original node indices.
         unprocessed_nodes = {}
 
-        def add_unprocessed_node(layer, node_data):
-            if layer not in unprocessed_nodes:
-                unprocessed_nodes[layer] = [node_data]
-            else:
-                unprocessed_nodes[layer].append(node_data)
+        # Dictionary mapping a layer name to the layers whose
+        # next call is waiting for a node of that layer.
+        waiting_layers = {}
+
+        def get_input_tensors(node_data):
+            """Collects the input tensors of a layer call.
+
+            # Arguments
+                node_data: list of inbound data for the call.
 
-        def process_node(layer, node_data):
+            # Returns
+                A tuple `(input_tensors, kwargs, missing_layer_name)`.
+                `missing_layer_name` is the name of the inbound
+                layer that does not yet have the required node,
+                or None if all the inputs exist.
+
+            # Raises
+                ValueError: In case of improperly formatted `node_data`.
+            """
             input_tensors = []
+            kwargs = {}
             for input_data in node_data:
                 inbound_layer_name = input_data[0]
                 inbound_node_index = input_data[1]
@@ -975,61 +1217,76 @@ class Network(Layer):
                     kwargs = input_data[3]
                 else:
                     raise ValueError('Improperly formatted model config.')
-                if inbound_layer_name not in created_layers:
-                    add_unprocessed_node(layer, node_data)
-                    return
-                inbound_layer = created_layers[inbound_layer_name]
-                if len(inbound_layer._inbound_nodes) <= inbound_node_index:
-                    add_unprocessed_node(layer, node_data)
-                    return
+                inbound_layer = created_layers.get(inbound_layer_name)
+                if (inbound_layer is None or
+                        len(inbound_layer._inbound_nodes) <= inbound_node_index):
+                    return None, None, inbound_layer_name
                 inbound_node = inbound_layer._inbound_nodes[inbound_node_index]
                 input_tensors.append(
                     inbound_node.output_tensors[inbound_tensor_index])
-            # Call layer on its inputs, thus creating the node
-            # and building the layer if needed.
-            if input_tensors:
-                layer(unpack_singleton(input_tensors), **kwargs)
+            return input_tensors, kwargs, None
 
-        def process_layer(layer_data):
-            """Deserializes a layer, then call it on appropriate inputs.
+        def process_layer_nodes(layer):
+            """Makes the pending calls of a layer, in order.
+
+            Stops at the first call whose inputs do not exist yet,
+            and registers the layer as waiting for the missing
+            inbound layer.
 
             # Arguments
-                layer_data: layer config dict.
+                layer: layer instance.
 
-            # Raises
-                ValueError: In case of improperly formatted `layer_data` dict.
+            # Returns
+                Whether at least one new node was created.
             """
-            layer_name = layer_data['name']
-
-            # Instantiate layer.
-            from ..layers import deserialize as deserialize_layer
-
+            queue = unprocessed_nodes[layer]
+            created = False
+            while queue:
+                input_tensors, kwargs, missing = get_input_tensors(queue[0])
+                if missing is not None:
+                    waiting_layers.setdefault(missing, []).append(layer)
+                    break
+                queue.popleft()
+                # Call layer on its inputs, thus creating the node
+                # and building the layer if needed.
+                if input_tensors:
+                    layer(unpack_singleton(input_tensors), **kwargs)
+                    created = True
+            if not queue:
+                del unprocessed_nodes[layer]
+            return created
+
+        # First, we create all layers and enqueue their calls.
+        # We don't make layer calls on the fly because the inbound
+        # node may not yet exist, in case of layer shared at
+        # different topological depths (e.g. a model such as A(B(A(B(x))))).
+        ordered_layers = []
+        for layer_data in config['layers']:
             layer = deserialize_layer(layer_data,
                                       custom_objects=custom_objects)
-            created_layers[layer_name] = layer
-
-            # Gather layer inputs.
-            inbound_nodes_data = layer_data['inbound_nodes']
-            for node_data in inbound_nodes_data:
-                # We don't process nodes (i.e. make layer calls)
-                # on the fly because the inbound node may not yet exist,
-                # in case of layer shared at different topological depths
-                # (e.g. a model such as A(B(A(B(x)))))
-                add_unprocessed_node(layer, node_data)
-
-        # First, we create all layers and enqueue nodes to be processed
-        for layer_data in config['layers']:
-            process_layer(layer_data)
-        # Then we process nodes in order of layer depth.
-        # Nodes that cannot yet be processed (if the inbound node
-        # does not yet exist) are re-enqueued, and the process
-        # is repeated until all nodes are processed.
-        while unprocessed_nodes:
-            for layer_data in config['layers']:
-                layer = created_layers[layer_data['name']]
-                if layer in unprocessed_nodes:
-                    for node_data in unprocessed_nodes.pop(layer):
-                        process_node(layer, node_data)
+            created_layers[layer_data['name']] = layer
+            ordered_layers.append(layer)
+            if layer_data['inbound_nodes']:
+                unprocessed_nodes[layer] = collections.deque(
+                    layer_data['inbound_nodes'])
+
+        # Then we process the calls in order of layer depth.
+        # A layer whose next call cannot be made yet is put aside
+        # until the layer it waits for creates a new node, so that
+        # each call is attempted a bounded number of times.
+        pending = collections.deque(
+            layer for layer in ordered_layers if layer in unprocessed_nodes)
+        while pending:
+            layer = pending.popleft()
+            if layer not in unprocessed_nodes:
+                continue
+            if process_layer_nodes(layer):
+                pending.extend(waiting_layers.pop(layer.name, []))
+        if unprocessed_nodes:
+            raise ValueError('Improperly formatted model config: '
+                             'the calls of layers ' +
+                             str([layer.name for layer in unprocessed_nodes]) +
+                             ' refer to missing inbound nodes.')
 
         name = config.get('name')
         input_tensors = []
@@ -1089,7 +1346,7 @@ class Network(Layer):
         from ..models import save_model
         save_model(self, filepath, overwrite, include_optimizer)
 
-    def save_weights(self, filepath, overwrite=True):
+    def save_weights(self, filepath, overwrite=True, quantize=None):
         """Dumps all layer weights to a HDF5 file.
 
         The weight file has:
@@ -1106,9 +1363,15 @@ class Network(Layer):
             filepath: String, path to the file to save the weights to.
             overwrite: Whether to silently overwrite any existing file at the
                 target location, or provide the user with a manual prompt.
+            quantize: None (default), `"int8"` or `"float16"`.
+                Stores the kernels, recurrent kernels and embeddings
+                quantized, with per-channel scales for `"int8"`
+                (4x smaller than float32). They are dequantized
+                by `load_weights`. Meant for inference models.
 
         # Raises
             ImportError: If h5py is not available.
+            ValueError: In case of invalid `quantize` value.
         """
         if h5py is None:
             raise ImportError('`save_weights` requires h5py.')
@@ -1118,7 +1381,8 @@ class Network(Layer):
             if not proceed:
                 return
         with h5py.File(filepath, 'w') as f:
-            saving.save_weights_to_hdf5_group(f, self.layers)
+            saving.save_weights_to_hdf5_group(f, self.layers,
+                                              quantize=quantize)
             f.flush()
 
     def load_weights(self, filepath, by_name=False,
@@ -1182,35 +1446,31 @@ class Network(Layer):
         }
         return model_config
 
-    def to_json(self, **kwargs):
+    def to_json(self, compact=False, **kwargs):
         """Returns a JSON string containing the network configuration.
 
         To load a network from a JSON save file, use
         `keras.models.model_from_json(json_string, custom_objects={})`.
 
         # Arguments
+            compact: Whether to store the configs shared by several
+                layers only once (layers then only keep their names)
+                and to drop the whitespace between JSON items.
+                This makes the string much smaller for large generated
+                graphs (e.g. ensembles of identical heads).
+                Compact strings can be read with `model_from_json`.
             **kwargs: Additional keyword arguments
                 to be passed to `json.dumps()`.
 
         # Returns
             A JSON string.
         """
-        def get_json_type(obj):
-            # If obj is any numpy type
-            if type(obj).__module__ == np.__name__:
-                if isinstance(obj, np.ndarray):
-                    return obj.tolist()
-                else:
-                    return obj.item()
-
-            # If obj is a python 'type'
-            if type(obj).__name__ == type.__name__:
-                return obj.__name__
-
-            raise TypeError('Not JSON Serializable:', obj)
-
         model_config = self._updated_config()
-        return json.dumps(model_config, default=get_json_type, **kwargs)
+        if compact:
+            model_config['config'] = _compact_layer_configs(
+                model_config['config'])
+            kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(model_config, default=_get_json_type, **kwargs)
 
     def to_yaml(self, **kwargs):
         """Returns a yaml string containing the network configuration.
@@ -1231,7 +1491,8 @@ class Network(Layer):
         """
         return yaml.dump(self._updated_config(), **kwargs)
 
-    def summary(self, line_length=None, positions=None, print_fn=None):
+    def summary(self, line_length=None, positions=None, print_fn=None,
+                batch_size=None, dtype=None, sequence_length=None):
         """Prints a string summary of the network.
 
         # Arguments
@@ -1246,6 +1507,12 @@ class Network(Layer):
                 You can set it to a custom function
                 in order to capture the string summary.
                 It defaults to `print` (prints to stdout).
+            batch_size: If set, the summary includes the activation
+                memory of each layer and the estimated memory footprint
+                of the network at this batch size.
+            dtype: Data type of the activations for the memory estimate.
+            sequence_length: Length used for the undefined dimensions
+                of the inputs for the memory estimate.
         """
         if not self.built:
             raise ValueError(
@@ -1257,7 +1524,10 @@ class Network(Layer):
         return print_layer_summary(self,
                                    line_length=line_length,
                                    positions=positions,
-                                   print_fn=print_fn)
+                                   print_fn=print_fn,
+                                   batch_size=batch_size,
+                                   dtype=dtype,
+                                   sequence_length=sequence_length)
 
     def __getstate__(self):
         return saving.pickle_model(self)
@@ -1267,6 +1537,188 @@ class Network(Layer):
         self.__dict__.update(model.__dict__)
 
 
+def _is_recomputable(node):
+    """Checks whether the call of a node can be replayed identically.
+
+    # Arguments
+        node: A `Node` instance.
+
+    # Returns
+        False for calls of stateful layers or of layers with updates,
+        and for calls introducing a dependency on the learning phase
+        (e.g. dropout, whose random mask would change), True otherwise.
+    """
+    layer = node.outbound_layer
+    if not node.inbound_layers or getattr(layer, 'stateful', False):
+        return False
+    if layer.get_updates_for(node.input_tensors):
+        return False
+    uses_learning_phase = [getattr(x, '_uses_learning_phase', False)
+                           for x in node.input_tensors]
+    return (any(uses_learning_phase) or
+            not any(getattr(x, '_uses_learning_phase', False)
+                    for x in node.output_tensors))
+
+
+def _get_json_type(obj):
+    """Serializes numpy values and classes for `json.dumps`.
+
+    # Arguments
+        obj: object that `json` cannot serialize natively.
+
+    # Returns
+        A JSON-serializable version of `obj`.
+
+    # Raises
+        TypeError: if `obj` cannot be serialized.
+    """
+    # If obj is any numpy type
+    if type(obj).__module__ == np.__name__:
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        else:
+            return obj.item()
+
+    # If obj is a python 'type'
+    if type(obj).__name__ == type.__name__:
+        return obj.__name__
+
+    raise TypeError('Not JSON Serializable:', obj)
+
+
+def _strip_names(config, names):
+    """Returns a copy of a layer config without its (nested) names.
+
+    # Arguments
+        config: layer config (any JSON-like structure).
+        names: list to which the removed names are appended,
+            in a deterministic order (see `_restore_names`).
+
+    # Returns
+        The config with every `name` entry set to None.
+    """
+    if isinstance(config, dict):
+        stripped = {}
+        for key in sorted(config):
+            if key == 'name':
+                names.append(config[key])
+                stripped[key] = None
+            else:
+                stripped[key] = _strip_names(config[key], names)
+        return stripped
+    if isinstance(config, (list, tuple)):
+        return [_strip_names(value, names) for value in config]
+    return config
+
+
+def _restore_names(config, names):
+    """Puts back in place the names removed by `_strip_names`.
+
+    # Arguments
+        config: stripped layer config, modified in place.
+        names: iterator over the removed names.
+    """
+    if isinstance(config, dict):
+        for key in sorted(config):
+            if key == 'name':
+                config[key] = next(names)
+            else:
+                _restore_names(config[key], names)
+    elif isinstance(config, list):
+        for value in config:
+            _restore_names(value, names)
+
+
+def _compact_layer_configs(config):
+    """Stores the layer configs shared by several layers only once.
+
+    Layers whose configs only differ by their (nested) names
+    refer to an entry of `config['shared_layer_configs']`
+    and keep their names in a `names` list.
+
+    # Arguments
+        config: network config, as returned by `get_config()`.
+
+    # Returns
+        The compact network config.
+    """
+    if not isinstance(config, dict) or 'layers' not in config:
+        return config
+    stripped_layers = []
+    counts = collections.Counter()
+    for layer_data in config['layers']:
+        names = []
+        stripped = _strip_names(layer_data['config'], names)
+        key = (layer_data['class_name'],
+               json.dumps(stripped, sort_keys=True, default=_get_json_type))
+        counts[key] += 1
+        stripped_layers.append((key, stripped, names))
+
+    shared_configs = []
+    shared_indices = {}
+    layers = []
+    for layer_data, (key, stripped, names) in zip(config['layers'],
+                                                  stripped_layers):
+        if counts[key] < 2:
+            layers.append(layer_data)
+            continue
+        if key not in shared_indices:
+            shared_indices[key] = len(shared_configs)
+            shared_configs.append(stripped)
+        layer_data = dict(layer_data)
+        del layer_data['config']
+        layer_data['shared_config'] = shared_indices[key]
+        layer_data['names'] = names
+        layers.append(layer_data)
+    if not shared_configs:
+        return config
+    config = dict(config)
+    config['layers'] = layers
+    config['shared_layer_configs'] = shared_configs
+    return config
+
+
+def _expand_layer_configs(config):
+    """Reverts `_compact_layer_configs`.
+
+    # Arguments
+        config: network config, compact or not.
+
+    # Returns
+        The network config with a full config for every layer.
+        The input config is not modified.
+    """
+    if 'shared_layer_configs' not in config:
+        return config
+    shared_configs = config['shared_layer_configs']
+    layers = []
+    for layer_data in config['layers']:
+        if 'shared_config' in layer_data:
+            layer_data = dict(layer_data)
+            layer_config = copy.deepcopy(
+                shared_configs[layer_data.pop('shared_config')])
+            _restore_names(layer_config, iter(layer_data.pop('names')))
+            layer_data['config'] = layer_config
+        layers.append(layer_data)
+    config = dict(config)
+    del config['shared_layer_configs']
+    config['layers'] = layers
+    return config
+
+
+def _shape_cache_key(input_shapes):
+    """Converts a list of input shapes to a key of `_output_shape_cache`.
+
+    # Arguments
+        input_shapes: List of shape tuples (or lists).
+
+    # Returns
+        A tuple of shape tuples.
+    """
+    return tuple(tuple(shape) if isinstance(shape, list) else shape
+                 for shape in input_shapes)
+
+
 def _make_node_key(layer_name, node_index):
     return layer_name + '_ib-' + str(node_index)
 
@@ -1423,9 +1875,9 @@ def _map_graph_network(inputs, outputs):
     # Check that all tensors required are computable.
     # computable_tensors: all tensors in the graph
     # that can be computed from the inputs provided.
-    computable_tensors = []
+    computable_tensors = set()
     for x in inputs:
-        computable_tensors.append(x)
+        computable_tensors.add(id(x))
 
     layers_with_complete_input = []  # To provide a better error msg.
     for depth in depth_keys:
@@ -1433,7 +1885,7 @@ def _map_graph_network(inputs, outputs):
             layer = node.outbound_layer
             if layer:
                 for x in node.input_tensors:
-                    if x not in computable_tensors:
+                    if id(x) not in computable_tensors:
                         raise ValueError('Graph disconnected: '
                                          'cannot obtain value for tensor ' +
                                          str(x) + ' at layer "' +
@@ -1442,16 +1894,16 @@ def _map_graph_network(inputs, outputs):
                                          'were accessed without issue: ' +
                                          str(layers_with_complete_input))
                 for x in node.output_tensors:
-                    computable_tensors.append(x)
+                    computable_tensors.add(id(x))
                 layers_with_complete_input.append(layer.name)
 
     # Ensure name unicity, which will be crucial for serialization
     # (since serialized nodes refer to layers by their name).
-    all_names = [layer.name for layer in layers]
-    for name in all_names:
-        if all_names.count(name) != 1:
-            raise ValueError('The name "' + name + '" is used ' +
-                             str(all_names.count(name)) +
+    name_counts = collections.Counter(layer.name for layer in layers)
+    for layer in layers:
+        if name_counts[layer.name] != 1:
+            raise ValueError('The name "' + layer.name + '" is used ' +
+                             str(name_counts[layer.name]) +
                              ' times in the model. '
                              'All layer names should be unique.')
     return network_nodes, nodes_by_depth, layers, layers_by_depth
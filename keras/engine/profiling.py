@@ -0,0 +1,258 @@
+"""Per-layer profiling of the functions of a `Model`.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import re
+
+import numpy as np
+
+from .. import backend as K
+
+
+_UNATTRIBUTED = '(unattributed)'
+
+
+class LayerProfile(object):
+    """Collects the op time and activation bytes of each layer of a model.
+
+    Created by `Model.compile(..., profile=True)`. The functions of the
+    model are then built with the backend profiler turned on, and the
+    profiled ops are attributed to the top-level layers of the model
+    (nested models count as one layer):
+
+    - With TensorFlow, every call is traced (`tf.RunOptions.FULL_TRACE`)
+        and ops are attributed through their name scope, which starts
+        with the name of the layer that created them. Gradient ops
+        (under a `gradients` scope) are counted as backward time.
+    - With Theano, the functions are compiled with a
+        `theano.compile.profiling.ProfileStats`, and ops are attributed
+        through tags set on the graph of each layer call. Ops created or
+        fused by the graph optimizer, gradient ops and the loss are
+        reported as unattributed, and activation bytes are only
+        collected when `theano.config.profile_memory` is set.
+
+    # Arguments
+        model: A `Model` instance.
+
+    # Raises
+        ValueError: if the backend does not support profiling.
+    """
+
+    def __init__(self, model):
+        if K.backend() not in {'tensorflow', 'theano'}:
+            raise ValueError('Layer profiling is only supported with the '
+                             'TensorFlow and Theano backends.')
+        self.model = model
+        self.layer_names = set(layer.name for layer in model.layers)
+        self._theano_stats = None
+        self._run_options = None
+        self._run_metadata = None
+        self.reset()
+        if K.backend() == 'tensorflow':
+            import tensorflow as tf
+            self._run_options = tf.RunOptions(
+                trace_level=tf.RunOptions.FULL_TRACE)
+            self._run_metadata = tf.RunMetadata()
+        else:
+            from theano.compile.profiling import ProfileStats
+            self._theano_stats = ProfileStats(atexit_print=False)
+            self._tag_theano_graph()
+
+    def reset(self):
+        """Clears the collected statistics."""
+        self.calls = 0
+        self.forward_time = {}
+        self.backward_time = {}
+        self.activation_bytes = {}
+        if self._theano_stats is not None:
+            self._theano_stats.apply_time.clear()
+            self._theano_stats.apply_callcount.clear()
+            self._theano_stats.fct_callcount = 0
+
+    def function_kwargs(self):
+        """Returns the `K.function` arguments that turn on the profiler.
+
+        # Returns
+            A dictionary of keyword arguments.
+        """
+        if self._theano_stats is not None:
+            return {'profile': self._theano_stats}
+        return {'options': self._run_options,
+                'run_metadata': self._run_metadata}
+
+    def wrap(self, function):
+        """Wraps a backend function to record its profile on each call.
+
+        # Arguments
+            function: Function returned by `K.function`, built with
+                `function_kwargs()`.
+
+        # Returns
+            A callable with the same signature.
+        """
+        return _ProfiledFunction(function, self)
+
+    def record(self):
+        """Records the profile of the last function call."""
+        self.calls += 1
+        if self._run_metadata is None:
+            # Theano accumulates its statistics itself.
+            return
+        for dev_stats in self._run_metadata.step_stats.dev_stats:
+            # GPU streams duplicate the ops of their device.
+            if ('stream:' in dev_stats.device and
+                    not dev_stats.device.endswith('stream:all')):
+                continue
+            for node_stats in dev_stats.node_stats:
+                layer_name, backward = self._attribute(node_stats.node_name)
+                seconds = node_stats.all_end_rel_micros * 1e-6
+                if backward:
+                    _add(self.backward_time, layer_name, seconds)
+                    continue
+                _add(self.forward_time, layer_name, seconds)
+                num_bytes = 0
+                for output in node_stats.output:
+                    num_bytes += (output.tensor_description
+                                  .allocation_description.requested_bytes)
+                _add(self.activation_bytes, layer_name, num_bytes)
+        self._run_metadata.Clear()
+
+    def get_stats(self):
+        """Returns the per-layer statistics.
+
+        # Returns
+            A dictionary mapping layer names (and `"(unattributed)"`)
+            to `(forward_seconds, backward_seconds, activation_bytes)`
+            tuples, summed over all the profiled calls.
+        """
+        forward_time = dict(self.forward_time)
+        backward_time = dict(self.backward_time)
+        activation_bytes = dict(self.activation_bytes)
+        if self._theano_stats is not None:
+            stats = self._theano_stats
+            for node, seconds in stats.apply_time.items():
+                layer_name = getattr(node.tag, 'keras_layer', _UNATTRIBUTED)
+                _add(forward_time, layer_name, seconds)
+                calls = stats.apply_callcount.get(node, 0)
+                for output in node.outputs:
+                    shape = stats.variable_shape.get(output)
+                    if shape is None or not hasattr(output, 'dtype'):
+                        continue
+                    num_bytes = (np.prod(shape) *
+                                 np.dtype(output.dtype).itemsize)
+                    _add(activation_bytes, layer_name, int(num_bytes) * calls)
+        names = set(forward_time) | set(backward_time)
+        return dict((name, (forward_time.get(name, 0.),
+                            backward_time.get(name, 0.),
+                            activation_bytes.get(name, 0)))
+                    for name in names)
+
+    def summary(self, line_length=None, positions=None, print_fn=None):
+        """Prints the per-layer statistics as a table.
+
+        # Arguments
+            line_length: Total length of printed lines.
+            positions: Relative or absolute positions of log elements
+                in each line. If not provided,
+                defaults to `[.4, .55, .7, .87, 1.]`.
+            print_fn: Print function to use (defaults to `print`).
+        """
+        if print_fn is None:
+            print_fn = print
+        line_length = line_length or 98
+        positions = positions or [.4, .55, .7, .87, 1.]
+        if positions[-1] <= 1:
+            positions = [int(line_length * p) for p in positions]
+
+        def print_row(fields):
+            line = ''
+            for i in range(len(fields)):
+                if i > 0:
+                    line = line[:-1] + ' '
+                line += str(fields[i])
+                line = line[:positions[i]]
+                line += ' ' * (positions[i] - len(line))
+            print_fn(line)
+
+        stats = self.get_stats()
+        calls = max(self.calls, 1)
+        total_time = sum(f + b for f, b, _ in stats.values()) or 1.
+        print_fn('Profiled calls: %d' % self.calls)
+        print_fn('_' * line_length)
+        print_row(['Layer (type)', 'Forward (ms)', 'Backward (ms)',
+                   'Activations', '% time'])
+        print_fn('=' * line_length)
+        rows = [(layer.name + ' (' + layer.__class__.__name__ + ')',
+                 stats.get(layer.name, (0., 0., 0)))
+                for layer in self.model.layers]
+        if _UNATTRIBUTED in stats:
+            rows.append((_UNATTRIBUTED, stats[_UNATTRIBUTED]))
+        for name, (forward, backward, num_bytes) in rows:
+            print_row([name,
+                       '%.3f' % (forward * 1e3 / calls),
+                       '%.3f' % (backward * 1e3 / calls),
+                       '{:,}'.format(int(num_bytes // calls)),
+                       '%.1f' % (100. * (forward + backward) / total_time)])
+        print_fn('=' * line_length)
+        print_fn('Times and activation bytes are averaged over the calls.')
+
+    def _attribute(self, op_name):
+        """Finds the layer that created an op from its name.
+
+        # Arguments
+            op_name: Full (scoped) name of the op.
+
+        # Returns
+            A tuple `(layer_name, is_gradient)`.
+        """
+        scopes = op_name.split('/')
+        backward = 'gradients' in scopes
+        for scope in scopes[:-1]:
+            if scope in self.layer_names:
+                return scope, backward
+            # Scopes are uniquified when a layer is called again.
+            scope = re.sub(r'_\d+$', '', scope)
+            if scope in self.layer_names:
+                return scope, backward
+        return _UNATTRIBUTED, backward
+
+    def _tag_theano_graph(self):
+        """Tags the Theano ops of each layer call with the layer name."""
+        from theano.gof.graph import io_toposort
+        for depth in sorted(self.model._nodes_by_depth.keys(), reverse=True):
+            for node in self.model._nodes_by_depth[depth]:
+                if not node.inbound_layers:
+                    continue
+                for apply_node in io_toposort(node.input_tensors,
+                                              node.output_tensors):
+                    if not hasattr(apply_node.tag, 'keras_layer'):
+                        apply_node.tag.keras_layer = node.outbound_layer.name
+
+
+class _ProfiledFunction(object):
+    """Backend function recording its profile after each call.
+
+    # Arguments
+        function: Function returned by `K.function`.
+        profile: `LayerProfile` instance.
+    """
+
+    def __init__(self, function, profile):
+        self.function = function
+        self.profile = profile
+
+    def __call__(self, inputs):
+        outputs = self.function(inputs)
+        self.profile.record()
+        return outputs
+
+    def __getattr__(self, name):
+        if name == 'function':
+            raise AttributeError(name)
+        return getattr(self.function, name)
+
+
+def _add(totals, key, value):
+    totals[key] = totals.get(key, 0) + value
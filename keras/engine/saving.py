@@ -420,6 +420,10 @@ def load_model(filepath, custom_objects=None, compile=True):
     finally:
         if opened_new_file:
             f.close()
+    if K.function_cache_dir() is not None:
+        # Warm-start the prediction function from the compiled-function
+        # cache while loading, rather than on the first `predict` call.
+        model._make_predict_function()
     return model
 
 
@@ -558,9 +562,113 @@ def load_attributes_from_hdf5_group(group, name):
     return data
 
 
-def save_weights_to_hdf5_group(f, layers):
+def quantize_weight_value(value, mode='int8', axis=-1):
+    """Quantizes a weight array for storage.
+
+    `int8` quantization is symmetric and per-channel: each slice of
+    `value` along `axis` gets its own scale, so that its largest
+    absolute value maps to 127.
+
+    # Arguments
+        value: Numpy array, the weight value.
+        mode: One of `"int8"` or `"float16"`.
+        axis: Channel axis of the per-channel scales
+            (only used for `"int8"`).
+
+    # Returns
+        A tuple `(quantized_value, scale)`. `scale` is a float32
+        array of length `value.shape[axis]` for `"int8"`,
+        and None for `"float16"`.
+
+    # Raises
+        ValueError: In case of invalid `mode`.
+    """
+    if mode == 'float16':
+        return value.astype('float16'), None
+    if mode != 'int8':
+        raise ValueError('Unknown quantization mode: ' + str(mode))
+    axis %= value.ndim
+    reduction_axes = tuple(i for i in range(value.ndim) if i != axis)
+    scale = np.max(np.abs(value), axis=reduction_axes) / 127.
+    scale[scale == 0] = 1.
+    scale = scale.astype('float32')
+    broadcast_shape = [1] * value.ndim
+    broadcast_shape[axis] = -1
+    quantized = np.round(value / scale.reshape(broadcast_shape))
+    return np.clip(quantized, -127, 127).astype('int8'), scale
+
+
+def dequantize_weight_value(value, scale=None, axis=-1, dtype='float32'):
+    """Reverts `quantize_weight_value`.
+
+    # Arguments
+        value: Numpy array, the quantized weight value.
+        scale: Per-channel scales, or None for `"float16"` values.
+        axis: Channel axis of the per-channel scales.
+        dtype: Dtype of the returned array.
+
+    # Returns
+        The dequantized weight value.
+    """
+    if scale is None:
+        return value.astype(dtype)
+    broadcast_shape = [1] * value.ndim
+    broadcast_shape[axis % value.ndim] = -1
+    scale = np.asarray(scale, dtype=dtype).reshape(broadcast_shape)
+    return value.astype(dtype) * scale
+
+
+def _quantization_axis(layer):
+    """Returns the channel axis of the per-channel scales of a layer.
+
+    # Arguments
+        layer: Layer instance.
+
+    # Returns
+        The axis, `0` (one scale per token vector)
+        for `Embedding` layers and `-1` otherwise.
+    """
+    if layer.__class__.__name__ == 'Embedding':
+        return 0
+    return -1
+
+
+def _is_quantizable(value):
+    """Whether a weight value is quantized on export.
+
+    Only floating point matrices and higher rank arrays are
+    (kernels, recurrent kernels, embeddings): biases and
+    normalization statistics are small and sensitive to rounding.
+
+    # Arguments
+        value: Numpy array, the weight value.
+
+    # Returns
+        A boolean.
+    """
+    return value.ndim >= 2 and np.issubdtype(value.dtype, np.floating)
+
+
+def save_weights_to_hdf5_group(f, layers, quantize=None):
+    """Saves the weights of a list of layers to a HDF5 group.
+
+    # Arguments
+        f: A pointer to a HDF5 group.
+        layers: A list of layers.
+        quantize: None, `"int8"` or `"float16"`. If set, the kernels,
+            recurrent kernels and embeddings are stored quantized
+            (see `quantize_weight_value`), and are dequantized
+            by the weight loading functions.
+
+    # Raises
+        ValueError: In case of invalid `quantize` value.
+    """
     from .. import __version__ as keras_version
 
+    if quantize not in {None, 'int8', 'float16'}:
+        raise ValueError('`quantize` should be None, "int8" or "float16", '
+                         'got: ' + str(quantize))
+
     save_attributes_to_hdf5_group(
         f, 'layer_names', [layer.name.encode('utf8') for layer in layers])
     f.attrs['backend'] = K.backend().encode('utf8')
@@ -579,6 +687,16 @@ def save_weights_to_hdf5_group(f, layers):
             weight_names.append(name.encode('utf8'))
         save_attributes_to_hdf5_group(g, 'weight_names', weight_names)
         for name, val in zip(weight_names, weight_values):
+            if quantize and _is_quantizable(val):
+                axis = _quantization_axis(layer)
+                quantized, scale = quantize_weight_value(val, quantize, axis)
+                param_dset = g.create_dataset(name, data=quantized)
+                param_dset.attrs['quantization'] = quantize.encode('utf8')
+                param_dset.attrs['dtype'] = str(val.dtype).encode('utf8')
+                if scale is not None:
+                    param_dset.attrs['quantization_axis'] = axis
+                    g.create_dataset(name + b':scale', data=scale)
+                continue
             param_dset = g.create_dataset(name, val.shape,
                                           dtype=val.dtype)
             if not val.shape:
@@ -588,6 +706,28 @@ def save_weights_to_hdf5_group(f, layers):
                 param_dset[:] = val
 
 
+def _load_weight_value(g, weight_name):
+    """Reads a weight value, dequantizing it if needed.
+
+    # Arguments
+        g: A pointer to the HDF5 group of a layer.
+        weight_name: Name of the weight dataset.
+
+    # Returns
+        The weight value, as a Numpy array.
+    """
+    param_dset = g[weight_name]
+    value = np.asarray(param_dset)
+    if 'quantization' not in param_dset.attrs:
+        return value
+    dtype = param_dset.attrs['dtype'].decode('utf8')
+    if 'quantization_axis' in param_dset.attrs:
+        return dequantize_weight_value(
+            value, np.asarray(g[weight_name + ':scale']),
+            int(param_dset.attrs['quantization_axis']), dtype)
+    return dequantize_weight_value(value, dtype=dtype)
+
+
 def preprocess_weights_for_loading(layer, weights,
                                    original_keras_version=None,
                                    original_backend=None,
@@ -1035,7 +1175,8 @@ def load_weights_from_hdf5_group(f, layers, reshape=False):
     for k, name in enumerate(layer_names):
         g = f[name]
         weight_names = load_attributes_from_hdf5_group(g, 'weight_names')
-        weight_values = [np.asarray(g[weight_name]) for weight_name in weight_names]
+        weight_values = [_load_weight_value(g, weight_name)
+                         for weight_name in weight_names]
         layer = filtered_layers[k]
         symbolic_weights = layer.weights
         weight_values = preprocess_weights_for_loading(layer,
@@ -1103,7 +1244,8 @@ def load_weights_from_hdf5_group_by_name(f, layers, skip_mismatch=False,
     for k, name in enumerate(layer_names):
         g = f[name]
         weight_names = load_attributes_from_hdf5_group(g, 'weight_names')
-        weight_values = [np.asarray(g[weight_name]) for weight_name in weight_names]
+        weight_values = [_load_weight_value(g, weight_name)
+                         for weight_name in weight_names]
 
         for layer in index.get(name, []):
             symbolic_weights = layer.weights
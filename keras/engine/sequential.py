@@ -10,6 +10,7 @@ import copy
 from . import network
 from .training import Model
 from .base_layer import Layer
+from .base_layer import invalidate_graph_caches
 from .input_layer import Input
 from .input_layer import InputLayer
 from .. import backend as K
@@ -189,6 +190,7 @@ class Sequential(Model):
             self.build()
         else:
             self._layers.append(layer)
+            invalidate_graph_caches()
 
     def pop(self):
         """Removes the last layer in the model.
@@ -200,6 +202,7 @@ class Sequential(Model):
             raise TypeError('There are no layers in the model.')
 
         self._layers.pop()
+        invalidate_graph_caches()
         self.built = False
         if not self.layers:
             self.outputs = None
@@ -290,7 +293,7 @@ class Sequential(Model):
         if 'name' in config:
             name = config['name']
             build_input_shape = config.get('build_input_shape')
-            layer_configs = config['layers']
+            layer_configs = network._expand_layer_configs(config)['layers']
         model = cls(name=name)
         for conf in layer_configs:
             layer = layer_module.deserialize(conf,
@@ -9,6 +9,7 @@ import copy
 import numpy as np
 
 from .network import Network
+from .profiling import LayerProfile
 from .base_layer import Layer
 from .training_utils import collect_metrics
 from .training_utils import check_array_length_consistency
@@ -41,6 +42,8 @@ class Model(Network):
                 sample_weight_mode=None,
                 weighted_metrics=None,
                 target_tensors=None,
+                profile=False,
+                checkpoint_segments=None,
                 **kwargs):
         """Configures the model for training.
 
@@ -84,10 +87,28 @@ class Model(Network):
                 can specify them via the `target_tensors` argument. It can be
                 a single tensor (for a single-output model), a list of tensors,
                 or a dict mapping output names to target tensors.
+            profile: Whether to profile the train, test and predict
+                functions per layer (TensorFlow and Theano only).
+                The collected statistics are printed by
+                `model.profile_summary()`. Profiling slows down
+                every call, so only enable it to investigate.
+            checkpoint_segments: None or integer. If set, the loss is
+                computed with gradient checkpointing: the layer calls of
+                the model are split into this many segments, and the
+                activations inside a segment are recomputed during the
+                backward pass instead of being kept (see
+                `Network.checkpointed_outputs`). About the square root
+                of the number of layers gives the lowest memory use,
+                for about one more forward pass per training step.
+                TensorFlow and Theano only.
             **kwargs: When using the Theano/CNTK backends, these arguments
                 are passed into `K.function`.
                 When using the TensorFlow backend,
                 these arguments are passed into `tf.Session.run`.
+                With the Theano backend, `shape_cache_size=n` compiles
+                the functions of the model per combination of input
+                shapes, keeping the `n` most recently used ones (see
+                `warm_up`).
 
         # Raises
             ValueError: In case of invalid arguments for
@@ -325,6 +346,12 @@ class Model(Network):
         self.metrics_names = ['loss']
         self.metrics_tensors = []
 
+        if checkpoint_segments:
+            with K.name_scope('checkpointed'):
+                loss_outputs = self.checkpointed_outputs(checkpoint_segments)
+        else:
+            loss_outputs = self.outputs
+
         # Compute total loss.
         total_loss = None
         with K.name_scope('loss'):
@@ -332,7 +359,7 @@ class Model(Network):
                 if i in skip_target_indices:
                     continue
                 y_true = self.targets[i]
-                y_pred = self.outputs[i]
+                y_pred = loss_outputs[i]
                 weighted_loss = weighted_losses[i]
                 sample_weight = sample_weights[i]
                 mask = masks[i]
@@ -463,6 +490,12 @@ class Model(Network):
         # be compiled lazily when required.
         # This saves time when the user is not using all functions.
         self._function_kwargs = kwargs
+        if profile:
+            self._layer_profile = LayerProfile(self)
+            self._function_kwargs = dict(
+                kwargs, **self._layer_profile.function_kwargs())
+        else:
+            self._layer_profile = None
 
         self.train_function = None
         self.test_function = None
@@ -525,6 +558,7 @@ class Model(Network):
                     updates=updates,
                     name='train_function',
                     **self._function_kwargs)
+                self.train_function = self._profiled(self.train_function)
 
     def _make_test_function_only_metrics(self):
         if not hasattr(self, 'test_function'):
@@ -558,6 +592,7 @@ class Model(Network):
                 updates=self.state_updates + self.metrics_updates,
                 name='test_function',
                 **self._function_kwargs)
+            self.test_function = self._profiled(self.test_function)
 
     def _make_predict_function(self):
         if not hasattr(self, 'predict_function'):
@@ -575,6 +610,51 @@ class Model(Network):
                                                updates=self.state_updates,
                                                name='predict_function',
                                                **kwargs)
+            self.predict_function = self._profiled(self.predict_function)
+
+    def _profiled(self, function):
+        """Wraps a backend function to record its per-layer profile.
+
+        # Arguments
+            function: Function returned by `K.function`.
+
+        # Returns
+            `function`, wrapped if the model was compiled
+            with `profile=True`.
+        """
+        layer_profile = getattr(self, '_layer_profile', None)
+        if layer_profile is None:
+            return function
+        return layer_profile.wrap(function)
+
+    def profile_summary(self, line_length=None, positions=None,
+                        print_fn=None, reset=False):
+        """Prints the per-layer profile of the model functions.
+
+        Requires the model to be compiled with `profile=True`. The table
+        lists, for each layer, the average forward and backward op time
+        and activation bytes per function call (train, test or predict
+        batch) since compilation or the last reset.
+
+        # Arguments
+            line_length: Total length of printed lines.
+            positions: Relative or absolute positions of log elements
+                in each line.
+            print_fn: Print function to use (defaults to `print`).
+            reset: Whether to clear the statistics after printing them.
+
+        # Raises
+            RuntimeError: if the model was not compiled with `profile=True`.
+        """
+        layer_profile = getattr(self, '_layer_profile', None)
+        if layer_profile is None:
+            raise RuntimeError('The model must be compiled with '
+                               '`profile=True` to be profiled.')
+        layer_profile.summary(line_length=line_length,
+                              positions=positions,
+                              print_fn=print_fn)
+        if reset:
+            layer_profile.reset()
 
     def _uses_dynamic_learning_phase(self):
         return (self.uses_learning_phase and
@@ -1336,6 +1416,46 @@ class Model(Network):
         outputs = self.predict_function(ins)
         return unpack_singleton(outputs)
 
+    def warm_up(self, x, y=None, sample_weight=None):
+        """Prepares the model functions for batches shaped like `x` and `y`.
+
+        Call it once per known batch shape (e.g. once per bucket of
+        a dataset bucketed by sequence length) before training. With the
+        Theano backend and `shape_cache_size` passed to `compile`, the
+        functions specialized to these shapes are compiled. With the
+        TensorFlow backend, the feed path of the functions is set up and
+        run once on zero-valued inputs of these shapes. The weights and
+        the state of the model are not changed.
+
+        # Arguments
+            x: Numpy array (or list or dictionary of arrays) shaped like
+                the input batches. Only the shapes are used.
+            y: Numpy array (or list or dictionary of arrays) shaped like
+                the target batches. If given, the train and test functions
+                are prepared, otherwise the predict function.
+            sample_weight: Optional array shaped like the sample weights
+                of the batches.
+        """
+        if y is None:
+            x, _, _ = self._standardize_user_data(x)
+            if self._uses_dynamic_learning_phase():
+                x = x + [0.]
+            self._make_predict_function()
+            functions = [self.predict_function]
+        else:
+            x, y, sample_weights = self._standardize_user_data(
+                x, y,
+                sample_weight=sample_weight)
+            x = x + y + sample_weights
+            if self._uses_dynamic_learning_phase():
+                x = x + [0.]
+            self._make_train_function()
+            self._make_test_function()
+            functions = [self.train_function, self.test_function]
+        for f in functions:
+            if hasattr(f, 'warm_up'):
+                f.warm_up([np.shape(value) for value in x])
+
     @interfaces.legacy_generator_methods_support
     def fit_generator(self, generator,
                       steps_per_epoch=None,
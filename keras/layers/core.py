@@ -1361,14 +1361,11 @@ class WeightedSum(Layer):
         values = inputs[0]
         weights = inputs[1]
 
-        # tile weights before summing
-        K.repeatRdim(weights, K.shape(values)[1], axis=1)
-
-        # inputs = K.dot(values, weights)
+        # weights are broadcast along dim=1 by the multiplication, and
+        # all the summed dimensions are reduced at once
         inputs = values * weights
-
-        for d in self.sum_dims:
-            inputs = K.sum(inputs, axis=d)
+        if self.sum_dims:
+            inputs = K.sum(inputs, axis=self.sum_dims)
         return inputs
 
     def compute_output_shape(self, input_shape):
@@ -1814,15 +1811,12 @@ class PositionwiseFeedForwardDense(Layer):
         self.built = True
 
     def call(self, inputs, mask=None):
-        intermediate_output = K.dot(inputs, self.kernel1)
-        if self.use_bias:
-            intermediate_output = K.bias_add(intermediate_output, self.bias1)
-        if self.activation is not None:
-            intermediate_output = self.activation(intermediate_output)
-        output = K.dot(intermediate_output, self.kernel2)
-        if self.use_bias:
-            output = K.bias_add(output, self.bias2)
-
+        intermediate_output = K.fused_bias_act(
+            K.dot(inputs, self.kernel1),
+            self.bias1 if self.use_bias else None,
+            self.activation)
+        output = K.fused_bias_act(K.dot(intermediate_output, self.kernel2),
+                                  self.bias2 if self.use_bias else None)
         return output
 
     def compute_output_shape(self, input_shape):
@@ -6055,11 +6055,11 @@ class AttLSTMCond(Recurrent):
 
     def _ln(self, x, slc):
         # sample-wise normalization
-        m = K.mean(x, axis=-1, keepdims=True)
-        std = K.sqrt(K.var(x, axis=-1, keepdims=True) + self.epsilon_layer_normalization)
-        x_normed = (x - m) / (std + self.epsilon_layer_normalization)
-        x_normed = eval('self.gamma_' + slc) * x_normed + eval('self.beta_' + slc)
-        return x_normed
+        return K.layer_norm(x,
+                            eval('self.gamma_' + slc),
+                            eval('self.beta_' + slc),
+                            axis=-1,
+                            epsilon=self.epsilon_layer_normalization)
 
     def call(self, inputs, mask=None, training=None, initial_state=None):
         # input shape: (nb_samples, time (padded with zeros), input_dim)
@@ -6726,11 +6726,11 @@ class AttConditionalLSTMCond(Recurrent):
 
     def _ln(self, x, slc):
         # sample-wise normalization
-        m = K.mean(x, axis=-1, keepdims=True)
-        std = K.sqrt(K.var(x, axis=-1, keepdims=True) + self.epsilon_layer_normalization)
-        x_normed = (x - m) / (std + self.epsilon_layer_normalization)
-        x_normed = eval('self.gamma_' + slc) * x_normed + eval('self.beta_' + slc)
-        return x_normed
+        return K.layer_norm(x,
+                            eval('self.gamma_' + slc),
+                            eval('self.beta_' + slc),
+                            axis=-1,
+                            epsilon=self.epsilon_layer_normalization)
 
     def call(self, inputs, mask=None, training=None, initial_state=None):
         # input shape: (nb_samples, time (padded with zeros), input_dim)
@@ -19,8 +19,11 @@ from .generic_utils import serialize_keras_object
 from .generic_utils import deserialize_keras_object
 from .generic_utils import Progbar
 from .layer_utils import convert_all_kernels_in_model
+from .layer_utils import estimate_memory
 from .layer_utils import get_source_inputs
+from .layer_utils import max_batch_size
 from .layer_utils import print_summary
+from .layer_utils import quantization_report
 from .vis_utils import plot_model
 from .np_utils import to_categorical
 from .np_utils import normalize
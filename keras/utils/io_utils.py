@@ -5,6 +5,7 @@ from __future__ import print_function
 
 import numpy as np
 from collections import defaultdict
+from collections import OrderedDict
 import sys
 
 
@@ -37,6 +38,20 @@ class HDF5Matrix(object):
     Optionally, a normalizer function (or lambda) can be given. This will
     be called on every slice of data retrieved.
 
+    Index arrays (e.g. the shuffled batches drawn by `fit(shuffle=True)`)
+    are read in sorted order and the original order is restored in memory,
+    so any permutation of rows can be requested.
+
+    Setting `cache_size` keeps the most recently used blocks of
+    `chunk_size` rows in memory (least recently used blocks are evicted
+    first). When the cache is enabled the normalizer is applied once per
+    cached block instead of once per call, so it must operate row-wise.
+    With `read_ahead`, a miss during sequential access also loads the
+    following blocks in the same HDF5 read (as many as fit in the cache
+    next to the requested blocks).
+
+    Negative integer indices count from the end of the (sliced) dataset.
+
     # Arguments
         datapath: string, path to a HDF5 file
         dataset: string, name of the HDF5 dataset in the file specified
@@ -44,13 +59,22 @@ class HDF5Matrix(object):
         start: int, start of desired slice of the specified dataset
         end: int, end of desired slice of the specified dataset
         normalizer: function to be called on data when retrieved
+        cache_size: int, maximum number of row blocks kept in memory.
+            0 disables the cache.
+        chunk_size: int, number of rows per cached block. Defaults to the
+            HDF5 chunk length of the dataset (or 1024 rows if the dataset
+            is not chunked).
+        read_ahead: int, number of extra blocks to load on a cache miss
+            when the dataset is being read sequentially. Only used if
+            `cache_size > 0`.
 
     # Returns
         An array-like HDF5 dataset.
     """
     refs = defaultdict(int)
 
-    def __init__(self, datapath, dataset, start=0, end=None, normalizer=None):
+    def __init__(self, datapath, dataset, start=0, end=None, normalizer=None,
+                 cache_size=0, chunk_size=None, read_ahead=0):
         if h5py is None:
             raise ImportError('The use of HDF5Matrix requires '
                               'HDF5 and h5py installed.')
@@ -74,6 +98,28 @@ class HDF5Matrix(object):
         self._base_shape = first_val.shape[1:]
         self._base_dtype = first_val.dtype
 
+        if cache_size < 0:
+            raise ValueError('`cache_size` should be >= 0. '
+                             'Received: %s' % (cache_size,))
+        if read_ahead < 0:
+            raise ValueError('`read_ahead` should be >= 0. '
+                             'Received: %s' % (read_ahead,))
+        if chunk_size is None:
+            if self.data.chunks is not None:
+                chunk_size = self.data.chunks[0]
+            else:
+                chunk_size = 1024
+        if chunk_size < 1:
+            raise ValueError('`chunk_size` should be >= 1. '
+                             'Received: %s' % (chunk_size,))
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
+        self.read_ahead = read_ahead
+        self._cache = OrderedDict()
+        self._last_chunk = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+
     def __len__(self):
         return self.end - self.start
 
@@ -89,25 +135,117 @@ class HDF5Matrix(object):
             else:
                 raise IndexError
         elif isinstance(key, (int, np.integer)):
-            if key + self.start < self.end:
+            if key < 0:
+                key += len(self)
+            if 0 <= key and key + self.start < self.end:
                 idx = key + self.start
             else:
                 raise IndexError
-        elif isinstance(key, np.ndarray):
-            if np.max(key) + self.start < self.end:
-                idx = (self.start + key).tolist()
-            else:
-                raise IndexError
         else:
-            # Assume list/iterable
-            if max(key) + self.start < self.end:
-                idx = [x + self.start for x in key]
-            else:
-                raise IndexError
+            # Assume ndarray or list/iterable
+            key = np.asarray(key, dtype='int64').ravel()
+            if key.size:
+                key = np.where(key < 0, key + len(self), key)
+                if key.min() < 0 or key.max() + self.start >= self.end:
+                    raise IndexError
+            idx = self.start + key
+        if self.cache_size > 0:
+            return self._get_cached(idx)
+        if isinstance(idx, np.ndarray):
+            data = self._read_rows(idx)
+        else:
+            data = self.data[idx]
         if self.normalizer is not None:
-            return self.normalizer(self.data[idx])
+            return self.normalizer(data)
+        else:
+            return data
+
+    def _read_rows(self, idx):
+        """Reads arbitrary rows with a single increasing-order HDF5 read."""
+        unique_idx, inverse = np.unique(idx, return_inverse=True)
+        if unique_idx.size == 0:
+            return self.data[0:0]
+        # h5py only supports increasing, duplicate-free point selections,
+        # and contiguous selections are much cheaper than point ones.
+        first, last = unique_idx[0], unique_idx[-1]
+        if last - first + 1 == unique_idx.size:
+            data = self.data[first:last + 1]
+        else:
+            data = self.data[unique_idx.tolist()]
+        if np.array_equal(unique_idx, idx):
+            return data
+        return data[inverse]
+
+    def _get_cached(self, idx):
+        """Gathers rows from the block cache, loading missing blocks."""
+        scalar = isinstance(idx, (int, np.integer))
+        if isinstance(idx, slice):
+            rows = np.arange(idx.start, idx.stop)
+        else:
+            rows = np.atleast_1d(idx)
+        chunk_ids = rows // self.chunk_size
+        unique_chunks, inverse = np.unique(chunk_ids, return_inverse=True)
+        if unique_chunks.size > self.cache_size:
+            # The request does not fit in the cache, bypass it.
+            data = self._read_rows(rows)
+            if self.normalizer is not None:
+                data = self.normalizer(data)
+            if scalar:
+                return data[0]
+            return data
+        self._load_chunks(unique_chunks)
+        if unique_chunks.size == 1:
+            chunk = self._cache[unique_chunks[0]]
+            out = chunk[rows - unique_chunks[0] * self.chunk_size]
         else:
-            return self.data[idx]
+            out = np.empty((rows.size,) + self._base_shape,
+                           dtype=self._base_dtype)
+            for i, chunk_id in enumerate(unique_chunks):
+                mask = inverse == i
+                offsets = rows[mask] - chunk_id * self.chunk_size
+                out[mask] = self._cache[chunk_id][offsets]
+        if scalar:
+            return out[0]
+        return out
+
+    def _load_chunks(self, chunk_ids):
+        """Makes sure that the given (sorted) blocks are in the cache."""
+        num_chunks = (self.end - 1) // self.chunk_size + 1
+        for chunk_id in chunk_ids:
+            if chunk_id in self._cache:
+                self.cache_hits += 1
+                continue
+            self.cache_misses += 1
+            stop_chunk = chunk_id + 1
+            # Never read ahead more blocks than the cache can keep
+            # next to the requested ones.
+            read_ahead = min(self.read_ahead, self.cache_size - len(chunk_ids))
+            if read_ahead > 0 and self._last_chunk is not None and (
+                    chunk_id - 1 <= self._last_chunk <= chunk_id):
+                stop_chunk = min(chunk_id + 1 + read_ahead, num_chunks)
+                while stop_chunk - 1 > chunk_id and stop_chunk - 1 in self._cache:
+                    stop_chunk -= 1
+            row_start = chunk_id * self.chunk_size
+            row_stop = min(stop_chunk * self.chunk_size, self.end)
+            data = self.data[row_start:row_stop]
+            if self.normalizer is not None:
+                data = self.normalizer(data)
+            if stop_chunk == chunk_id + 1:
+                self._cache[chunk_id] = data
+                continue
+            for i in range(chunk_id, stop_chunk):
+                offset = (i - chunk_id) * self.chunk_size
+                # Copy, so that evicting a block releases its memory even if
+                # blocks from the same read are still cached.
+                self._cache[i] = data[offset:offset + self.chunk_size].copy()
+        # The requested blocks become the most recently used ones,
+        # so that eviction never drops a block we are about to gather from.
+        for chunk_id in chunk_ids:
+            self._cache[chunk_id] = self._cache.pop(chunk_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        if len(chunk_ids):
+            self._last_chunk = chunk_ids[-1]
 
     @property
     def shape(self):
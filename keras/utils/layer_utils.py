@@ -5,6 +5,8 @@ from __future__ import division
 from __future__ import print_function
 
 from .conv_utils import convert_kernel
+from .generic_utils import to_list
+from .generic_utils import unpack_singleton
 from .. import backend as K
 import numpy as np
 
@@ -21,7 +23,8 @@ def count_params(weights):
     return int(np.sum([K.count_params(p) for p in set(weights)]))
 
 
-def print_summary(model, line_length=None, positions=None, print_fn=None):
+def print_summary(model, line_length=None, positions=None, print_fn=None,
+                  batch_size=None, dtype=None, sequence_length=None):
     """Prints a summary of a model.
 
     # Arguments
@@ -36,10 +39,23 @@ def print_summary(model, line_length=None, positions=None, print_fn=None):
             You can set it to a custom function
             in order to capture the string summary.
             It defaults to `print` (prints to stdout).
+        batch_size: If set, the activation memory of each layer and
+            the estimated memory footprint of the model at this batch
+            size are added to the summary (see `estimate_memory`).
+        dtype: Data type of the activations for the memory estimate.
+            Defaults to `K.floatx()`.
+        sequence_length: Length used for the undefined dimensions of
+            the inputs (e.g. timesteps) for the memory estimate.
     """
     if print_fn is None:
         print_fn = print
 
+    if batch_size is not None:
+        memory = estimate_memory(model, batch_size,
+                                 dtype=dtype,
+                                 sequence_length=sequence_length)
+        layer_bytes = dict(memory['layers'])
+
     if model.__class__.__name__ == 'Sequential':
         sequential_like = True
     elif not model._is_graph_network:
@@ -73,15 +89,23 @@ def print_summary(model, line_length=None, positions=None, print_fn=None):
                     break
 
     if sequential_like:
-        line_length = line_length or 65
-        positions = positions or [.45, .85, 1.]
+        if batch_size is None:
+            line_length = line_length or 65
+            positions = positions or [.45, .85, 1.]
+        else:
+            line_length = line_length or 80
+            positions = positions or [.4, .7, .83, 1.]
         if positions[-1] <= 1:
             positions = [int(line_length * p) for p in positions]
         # header names for the different log elements
         to_display = ['Layer (type)', 'Output Shape', 'Param #']
     else:
-        line_length = line_length or 98
-        positions = positions or [.33, .55, .67, 1.]
+        if batch_size is None:
+            line_length = line_length or 98
+            positions = positions or [.33, .55, .67, 1.]
+        else:
+            line_length = line_length or 110
+            positions = positions or [.3, .5, .6, .71, 1.]
         if positions[-1] <= 1:
             positions = [int(line_length * p) for p in positions]
         # header names for the different log elements
@@ -103,6 +127,9 @@ def print_summary(model, line_length=None, positions=None, print_fn=None):
             line += ' ' * (positions[i] - len(line))
         print_fn(line)
 
+    if batch_size is not None:
+        to_display.insert(3, 'Activations')
+
     print_fn('_' * line_length)
     print_row(to_display, positions)
     print_fn('=' * line_length)
@@ -116,6 +143,8 @@ def print_summary(model, line_length=None, positions=None, print_fn=None):
         cls_name = layer.__class__.__name__
         fields = [name + ' (' + cls_name + ')',
                   output_shape, layer.count_params()]
+        if batch_size is not None:
+            fields.append(_format_bytes(layer_bytes.get(name, 0)))
         print_row(fields, positions)
 
     def print_layer_summary_with_connections(layer):
@@ -152,10 +181,12 @@ def print_summary(model, line_length=None, positions=None, print_fn=None):
                   output_shape,
                   layer.count_params(),
                   first_connection]
+        if batch_size is not None:
+            fields.insert(3, _format_bytes(layer_bytes.get(name, 0)))
         print_row(fields, positions)
         if len(connections) > 1:
             for i in range(1, len(connections)):
-                fields = ['', '', '', connections[i]]
+                fields = [''] * (len(to_display) - 1) + [connections[i]]
                 print_row(fields, positions)
 
     layers = model.layers
@@ -182,6 +213,326 @@ def print_summary(model, line_length=None, positions=None, print_fn=None):
     print_fn('Trainable params: {:,}'.format(trainable_count))
     print_fn('Non-trainable params: {:,}'.format(non_trainable_count))
     print_fn('_' * line_length)
+    if batch_size is not None:
+        print_fn('Memory estimate (batch size %d):' % batch_size)
+        print_fn('Parameters: ' + _format_bytes(memory['parameter_bytes']))
+        print_fn('Gradients and optimizer slots: ' +
+                 _format_bytes(memory['gradient_bytes'] +
+                               memory['optimizer_bytes']))
+        print_fn('Peak activations (inference / training): ' +
+                 _format_bytes(memory['peak_inference_bytes']) + ' / ' +
+                 _format_bytes(memory['peak_training_bytes']))
+        print_fn('Total (inference / training): ' +
+                 _format_bytes(memory['inference_bytes']) + ' / ' +
+                 _format_bytes(memory['training_bytes']))
+        print_fn('_' * line_length)
+
+
+# Number of variables each optimizer keeps per trainable weight.
+_OPTIMIZER_SLOTS = {
+    'SGD': 1,
+    'RMSprop': 1,
+    'Adagrad': 1,
+    'Adadelta': 2,
+    'Adam': 2,
+    'Adamax': 2,
+    'Nadam': 2,
+    'PAS': 1,
+}
+
+
+def estimate_memory(model, batch_size, dtype=None, sequence_length=None,
+                    optimizer=None):
+    """Estimates the memory footprint of a model, without running it.
+
+    The shapes of all the tensors of the model are computed with
+    `compute_output_shape` for the given batch size, and a liveness
+    analysis over the layer calls gives the peak size of the live
+    activations:
+
+    - for inference, a tensor is freed after its last use;
+    - for training, the activations are kept until the backward pass
+        of their first consumer, and the gradient of a tensor is live
+        from the backward pass of its last consumer to the backward
+        pass of the layer that produced it.
+
+    Memory held inside a layer call (e.g. the states of every timestep
+    of a recurrent layer, or temporaries of the backend) is not
+    included, so the result is a lower bound.
+
+    # Arguments
+        model: A graph `Model` (functional or `Sequential`).
+        batch_size: Integer, batch size of the estimate.
+        dtype: Data type of the activations. Defaults to `K.floatx()`.
+        sequence_length: Integer, length used for the undefined
+            dimensions of the inputs other than the batch dimension
+            (e.g. the timesteps of variable-length sequences).
+        optimizer: Optimizer instance or name used for the optimizer
+            slot memory. Defaults to the optimizer of the model if it
+            is compiled, no optimizer memory otherwise.
+
+    # Returns
+        A dictionary with keys (all sizes in bytes):
+            - `layers`: list of `(layer_name, activation_bytes)` tuples,
+                the size of the outputs of each layer (over all its
+                calls in the model).
+            - `activation_bytes`: size of all the activations.
+            - `peak_inference_bytes`: peak size of the live activations
+                during a forward pass.
+            - `peak_training_bytes`: peak size of the live activations
+                and activation gradients during a training step.
+            - `parameter_bytes`: size of the weights.
+            - `gradient_bytes`: size of the weight gradients.
+            - `optimizer_bytes`: size of the optimizer variables.
+            - `inference_bytes`: `parameter_bytes + peak_inference_bytes`.
+            - `training_bytes`: sum of `parameter_bytes`,
+                `gradient_bytes`, `optimizer_bytes`
+                and `peak_training_bytes`.
+
+    # Raises
+        ValueError: if the model is not a graph network, if the shape
+            of a tensor cannot be determined or if the slot count of
+            the optimizer is unknown.
+    """
+    from .. import optimizers
+
+    if dtype is None:
+        dtype = K.floatx()
+    itemsize = np.dtype(dtype).itemsize
+    plan = _plan_memory(model, batch_size, itemsize, sequence_length)
+    steps, tensor_bytes, output_keys, input_keys, layer_bytes = plan
+    peak_inference, peak_training = _peak_activations(
+        steps, tensor_bytes, output_keys, input_keys)
+
+    parameter_bytes = _weights_bytes(model.weights)
+    gradient_bytes = _weights_bytes(model.trainable_weights)
+    if optimizer is None:
+        optimizer = getattr(model, 'optimizer', None)
+    elif not isinstance(optimizer, optimizers.Optimizer):
+        optimizer = optimizers.get(optimizer)
+    if optimizer is None:
+        optimizer_bytes = 0
+    elif optimizer.weights:
+        # The optimizer has been built: count its actual variables.
+        optimizer_bytes = _weights_bytes(optimizer.weights)
+    else:
+        for cls in type(optimizer).__mro__:
+            if cls.__name__ in _OPTIMIZER_SLOTS:
+                slots = _OPTIMIZER_SLOTS[cls.__name__]
+                break
+        else:
+            raise ValueError('Unknown number of variables per weight '
+                             'for optimizer ' + type(optimizer).__name__ +
+                             '. Build its updates first, e.g. by '
+                             'training the model on a batch.')
+        if getattr(optimizer, 'amsgrad', False):
+            slots += 1
+        optimizer_bytes = slots * gradient_bytes
+
+    return {'layers': [(layer.name, layer_bytes.get(layer, 0))
+                       for layer in model.layers],
+            'activation_bytes': sum(tensor_bytes.values()),
+            'peak_inference_bytes': peak_inference,
+            'peak_training_bytes': peak_training,
+            'parameter_bytes': parameter_bytes,
+            'gradient_bytes': gradient_bytes,
+            'optimizer_bytes': optimizer_bytes,
+            'inference_bytes': parameter_bytes + peak_inference,
+            'training_bytes': (parameter_bytes + gradient_bytes +
+                               optimizer_bytes + peak_training)}
+
+
+def max_batch_size(model, memory_gb, training=True, dtype=None,
+                   sequence_length=None, optimizer=None):
+    """Returns the largest batch size whose estimated footprint fits.
+
+    The activation memory grows linearly with the batch size, so the
+    limit is solved from a single `estimate_memory` call.
+
+    # Arguments
+        model: A graph `Model` (functional or `Sequential`).
+        memory_gb: Available memory, in gigabytes (2 ** 30 bytes).
+        training: Whether to size the batch for training (including
+            gradients and optimizer variables) or for inference.
+        dtype: Data type of the activations. Defaults to `K.floatx()`.
+        sequence_length: Length used for the undefined dimensions of
+            the inputs (e.g. timesteps).
+        optimizer: Optimizer instance or name. Defaults to the
+            optimizer of the model if it is compiled.
+
+    # Returns
+        The batch size, 0 if not even one sample fits.
+
+    # Raises
+        ValueError: in the cases of `estimate_memory`.
+    """
+    memory = estimate_memory(model, 1, dtype=dtype,
+                             sequence_length=sequence_length,
+                             optimizer=optimizer)
+    if training:
+        per_sample = memory['peak_training_bytes']
+        fixed = memory['training_bytes'] - per_sample
+    else:
+        per_sample = memory['peak_inference_bytes']
+        fixed = memory['inference_bytes'] - per_sample
+    available = memory_gb * 2 ** 30 - fixed
+    if available < per_sample:
+        return 0
+    return int(available // max(per_sample, 1))
+
+
+def _plan_memory(network, batch_size, itemsize, sequence_length):
+    """Computes the size of the tensors of a network, in call order.
+
+    # Arguments
+        network: A graph `Network`.
+        batch_size: Integer, batch size.
+        itemsize: Size in bytes of an activation value.
+        sequence_length: Integer or None, length used for the undefined
+            dimensions of the inputs.
+
+    # Returns
+        A tuple `(steps, tensor_bytes, output_keys, input_keys,
+        layer_bytes)`. `steps` is a list of `(input_keys, output_keys,
+        inner_bytes)` tuples, one per layer call, where tensors are
+        identified by `(layer, node_index, tensor_index)` keys and
+        `inner_bytes` is the size of the activations of a nested
+        network. `tensor_bytes` maps keys to sizes and `layer_bytes`
+        maps layers to the size of their outputs.
+
+    # Raises
+        ValueError: if the network is not a graph network or the shape
+            of a tensor cannot be determined.
+    """
+    if not getattr(network, '_is_graph_network', False):
+        raise ValueError('Memory can only be estimated for graph '
+                         'networks (functional or Sequential models).')
+
+    def concrete_shape(shape, layer):
+        shape = list(shape)
+        if shape:
+            shape[0] = batch_size
+        for i in range(1, len(shape)):
+            if shape[i] is None:
+                shape[i] = sequence_length
+        if None in shape:
+            raise ValueError('The output shape of layer ' + layer.name +
+                             ' has undefined dimensions: ' + str(shape) +
+                             '. Pass `sequence_length` to estimate them.')
+        return tuple(shape)
+
+    steps = []
+    tensor_shapes = {}
+    tensor_bytes = {}
+    layer_bytes = {}
+    input_keys = set()
+    for depth in sorted(network._nodes_by_depth.keys(), reverse=True):
+        for node in network._nodes_by_depth[depth]:
+            layer = node.outbound_layer
+            inner_bytes = 0
+            if not node.inbound_layers:
+                # Input layer: its output is the input data.
+                keys = [(layer, node.node_index, 0)]
+                shapes = [concrete_shape(layer.batch_input_shape, layer)]
+                input_keys.update(keys)
+            else:
+                keys = list(zip(node.inbound_layers,
+                                node.node_indices,
+                                node.tensor_indices))
+                input_shapes = unpack_singleton(
+                    [tensor_shapes[key] for key in keys])
+                try:
+                    shapes = to_list(layer.compute_output_shape(input_shapes))
+                except (NotImplementedError, TypeError, ValueError):
+                    shapes = to_list(node.output_shapes)
+                shapes = [concrete_shape(shape, layer) for shape in shapes]
+                if getattr(layer, '_is_graph_network', False):
+                    inner = _plan_memory(layer, batch_size, itemsize,
+                                         sequence_length)
+                    _, inner_tensor_bytes, inner_outputs, inner_inputs, _ = inner
+                    inner_bytes = sum(
+                        num_bytes
+                        for key, num_bytes in inner_tensor_bytes.items()
+                        if key not in inner_outputs and
+                        key not in inner_inputs)
+            output_keys = []
+            for i, shape in enumerate(shapes):
+                key = (layer, node.node_index, i)
+                tensor_shapes[key] = shape
+                tensor_bytes[key] = int(np.prod(shape)) * itemsize
+                output_keys.append(key)
+            layer_bytes[layer] = (layer_bytes.get(layer, 0) + inner_bytes +
+                                  sum(tensor_bytes[key]
+                                      for key in output_keys))
+            steps.append((keys if node.inbound_layers else [],
+                          output_keys, inner_bytes))
+    network_outputs = set(network._output_coordinates)
+    return steps, tensor_bytes, network_outputs, input_keys, layer_bytes
+
+
+def _peak_activations(steps, tensor_bytes, output_keys, input_keys):
+    """Computes the peak size of the live activations of a network.
+
+    # Arguments
+        steps: Layer calls, as returned by `_plan_memory`.
+        tensor_bytes: Dictionary mapping tensor keys to sizes.
+        output_keys: Keys of the outputs of the network.
+        input_keys: Keys of the inputs of the network.
+
+    # Returns
+        A tuple `(peak_inference_bytes, peak_training_bytes)`.
+    """
+    num_steps = len(steps)
+    producer = {}
+    first_use = {}
+    last_use = {}
+    for i, (inputs, outputs, _) in enumerate(steps):
+        for key in inputs:
+            first_use.setdefault(key, i)
+            last_use[key] = i
+        for key in outputs:
+            producer[key] = i
+    for key in output_keys:
+        # The outputs are used by the loss, after the last layer call.
+        last_use[key] = num_steps
+
+    # Each array accumulates the sizes of the buffers live over
+    # intervals of steps, as differences then summed.
+    forward = np.zeros(num_steps + 2, dtype='int64')
+    # Index `i` of `backward` is the backward pass of step `i`,
+    # index `num_steps` the end of the forward pass.
+    backward = np.zeros(num_steps + 2, dtype='int64')
+
+    def add(live, start, end, num_bytes):
+        live[start] += num_bytes
+        live[end + 1] -= num_bytes
+
+    for i, (_, _, inner_bytes) in enumerate(steps):
+        add(forward, i, i, inner_bytes)
+        add(backward, i, num_steps, inner_bytes)
+    for key, num_bytes in tensor_bytes.items():
+        start = producer[key]
+        add(forward, start, last_use.get(key, start), num_bytes)
+        # The activation is needed until the backward pass of its
+        # first consumer.
+        add(backward, first_use.get(key, start), num_steps, num_bytes)
+        if key not in input_keys:
+            add(backward, start, last_use.get(key, start), num_bytes)
+    return (int(np.cumsum(forward).max()),
+            int(np.cumsum(backward).max()))
+
+
+def _weights_bytes(weights):
+    return sum(K.count_params(w) * np.dtype(K.dtype(w)).itemsize
+               for w in set(weights))
+
+
+def _format_bytes(num_bytes):
+    for unit in ['B', 'KB', 'MB']:
+        if num_bytes < 1024:
+            return '%.4g %s' % (num_bytes, unit)
+        num_bytes /= 1024.
+    return '%.4g GB' % num_bytes
 
 
 def convert_all_kernels_in_model(model):
@@ -209,6 +560,88 @@ def convert_all_kernels_in_model(model):
     K.batch_set_value(to_assign)
 
 
+def quantization_report(model, x, mode='int8', batch_size=32,
+                        print_fn=None):
+    """Measures the effect of weight quantization on a model.
+
+    The weights that `save_weights(..., quantize=mode)` would quantize
+    are replaced by their quantized-then-dequantized values, the model
+    predictions on `x` are compared with the original ones, and the
+    original weights are restored.
+
+    # Arguments
+        model: Keras model instance.
+        x: Input data, as accepted by `model.predict`.
+        mode: `"int8"` or `"float16"`.
+        batch_size: Batch size used for the predictions.
+        print_fn: Print function to use (defaults to `print`).
+            Set it to `lambda *args: None` to silence the report.
+
+    # Returns
+        A dictionary with keys:
+            - `weights`: list of `(weight_name, relative_error)` tuples,
+                the relative L2 error of each quantized weight.
+            - `outputs`: list (one entry per model output) of dictionaries
+                with keys `max_abs_diff`, `mean_abs_diff` and, for outputs
+                with several features, `argmax_agreement` (fraction of
+                the predictions whose argmax is unchanged).
+    """
+    from ..engine import saving
+
+    if print_fn is None:
+        print_fn = print
+
+    originals = []
+    to_assign = []
+    weight_errors = []
+    for layer in model.layers:
+        axis = saving._quantization_axis(layer)
+        for w, value in zip(layer.weights, K.batch_get_value(layer.weights)):
+            if not saving._is_quantizable(value):
+                continue
+            quantized, scale = saving.quantize_weight_value(value, mode, axis)
+            restored = saving.dequantize_weight_value(
+                quantized, scale, axis, dtype=value.dtype)
+            norm = np.linalg.norm(value)
+            error = np.linalg.norm(value - restored) / norm if norm else 0.
+            weight_errors.append((w.name, float(error)))
+            originals.append((w, value))
+            to_assign.append((w, restored))
+
+    reference = model.predict(x, batch_size=batch_size)
+    K.batch_set_value(to_assign)
+    try:
+        quantized_outputs = model.predict(x, batch_size=batch_size)
+    finally:
+        K.batch_set_value(originals)
+
+    if not isinstance(reference, list):
+        reference = [reference]
+        quantized_outputs = [quantized_outputs]
+    output_deltas = []
+    for ref, out in zip(reference, quantized_outputs):
+        diff = np.abs(ref - out)
+        delta = {'max_abs_diff': float(diff.max()),
+                 'mean_abs_diff': float(diff.mean())}
+        if ref.ndim > 1 and ref.shape[-1] > 1:
+            delta['argmax_agreement'] = float(
+                np.mean(ref.argmax(axis=-1) == out.argmax(axis=-1)))
+        output_deltas.append(delta)
+
+    print_fn('Quantization report (%s)' % mode)
+    print_fn('_' * 65)
+    print_fn('{:<50}{:>15}'.format('Weight', 'Rel. error'))
+    print_fn('=' * 65)
+    for name, error in weight_errors:
+        print_fn('{:<50}{:>15.2e}'.format(name, error))
+    print_fn('=' * 65)
+    for name, delta in zip(model.output_names, output_deltas):
+        print_fn('Output %s: ' % name +
+                 ', '.join('%s=%.4g' % (key, delta[key])
+                           for key in sorted(delta)))
+    return {'weights': weight_errors, 'outputs': output_deltas}
+
+
 def convert_dense_weights_data_format(dense,
                                       previous_feature_map_shape,
                                       target_data_format='channels_first'):
@@ -505,6 +505,54 @@ class TestBackend(object):
         new_val_list = [k.get_value(x) for x, k in zip(x_list, test_backend)]
         assert_list_pairwise(new_val_list)
 
+    @pytest.mark.skipif(K.backend() != 'theano',
+                        reason='Only Theano compiles functions ahead of time.')
+    def test_function_cache(self, tmpdir):
+        cache_dir = str(tmpdir)
+        K.set_function_cache_dir(cache_dir)
+        try:
+            outputs = []
+            for _ in range(2):
+                x = K.variable(np.ones((2, 3)))
+                y = K.placeholder(ndim=2)
+                f = K.function([y], [K.square(x) + y],
+                               updates=[(x, x * 2)])
+                outputs.append(f([np.ones((2, 3))])[0])
+                # The cached function updates the new variable.
+                assert_allclose(K.get_value(x), 2 * np.ones((2, 3)))
+            assert len(tmpdir.listdir()) == 1
+            assert_allclose(outputs[0], outputs[1])
+
+            # A different graph gets its own entry.
+            f = K.function([y], [K.square(x) - y])
+            assert len(tmpdir.listdir()) == 2
+        finally:
+            K.set_function_cache_dir(None)
+
+    @pytest.mark.skipif(K.backend() != 'theano',
+                        reason='Only Theano compiles functions per shapes.')
+    def test_function_shape_cache(self):
+        x = K.variable(0.)
+        y = K.placeholder(ndim=2)
+        f = K.function([y], [K.sum(y, axis=1)],
+                       updates=[(x, x + K.sum(y))],
+                       shape_cache_size=2)
+        for shape in [(2, 3), (2, 3), (4, 3), (1, 5), (2, 3)]:
+            value = np.ones(shape)
+            assert_allclose(f([value])[0], value.sum(axis=1))
+        # The least recently used (2, 3) function was evicted by (1, 5).
+        assert f.cache_hits == 1
+        assert f.cache_misses == 4
+        assert list(f._specialized.keys()) == [((1, 5),), ((2, 3),)]
+        assert_allclose(K.get_value(x), 6 + 6 + 12 + 5 + 6)
+
+        f.warm_up([(3, 3)])
+        f([np.ones((3, 3))])
+        assert f.cache_hits == 2
+
+        with pytest.raises(ValueError):
+            K.function([y], [y], shape_cache=2)
+
     @pytest.mark.skipif(K.backend() != 'tensorflow',
                         reason='Uses the `fetches` argument.')
     def test_function_tf_fetches(self):
@@ -1524,6 +1572,56 @@ class TestBackend(object):
             assert zth.shape == ztf.shape
             assert zth.shape == zc.shape
 
+    def test_layer_norm(self):
+        x_val = np.random.random((2, 5, 4)).astype(np.float32)
+        r_val = np.random.random((2, 5, 4)).astype(np.float32)
+        gamma_val = np.random.random((4,)).astype(np.float32)
+        beta_val = np.random.random((4,)).astype(np.float32)
+
+        def np_layer_norm(x, gamma=1., beta=0., axis=-1, epsilon=1e-3):
+            mean = x.mean(axis=axis, keepdims=True)
+            var = x.var(axis=axis, keepdims=True)
+            return (x - mean) / np.sqrt(var + epsilon) * gamma + beta
+
+        x, r = K.variable(x_val), K.variable(r_val)
+        gamma, beta = K.variable(gamma_val), K.variable(beta_val)
+        assert_allclose(K.eval(K.layer_norm(x)), np_layer_norm(x_val),
+                        atol=1e-5)
+        assert_allclose(K.eval(K.layer_norm(x, axis=1, epsilon=1e-5)),
+                        np_layer_norm(x_val, axis=1, epsilon=1e-5),
+                        atol=1e-5)
+        assert_allclose(K.eval(K.layer_norm(x, gamma, beta)),
+                        np_layer_norm(x_val, gamma_val, beta_val),
+                        atol=1e-5)
+        assert_allclose(K.eval(K.residual_add_norm(x, r, gamma, beta)),
+                        np_layer_norm(x_val + r_val, gamma_val, beta_val),
+                        atol=1e-5)
+
+        # gradients match the unfused op chain
+        def unfused(x):
+            mean = K.mean(x, axis=-1, keepdims=True)
+            var = K.var(x, axis=-1, keepdims=True)
+            return (x - mean) / K.sqrt(var + 1e-3) * gamma + beta
+
+        weights = K.variable(np.random.random((2, 5, 4)))
+        fused_grad = K.gradients(
+            K.sum(K.layer_norm(x, gamma, beta) * weights), [x, gamma])
+        unfused_grad = K.gradients(K.sum(unfused(x) * weights), [x, gamma])
+        for fused_value, unfused_value in zip(fused_grad, unfused_grad):
+            assert_allclose(K.eval(fused_value), K.eval(unfused_value),
+                            atol=1e-4)
+
+    def test_fused_bias_act(self):
+        x_val = np.random.random((2, 5, 4)).astype(np.float32) - 0.5
+        bias_val = np.random.random((4,)).astype(np.float32) - 0.5
+        x, bias = K.variable(x_val), K.variable(bias_val)
+        assert_allclose(K.eval(K.fused_bias_act(x, bias, K.relu)),
+                        np.maximum(x_val + bias_val, 0.), atol=1e-6)
+        assert_allclose(K.eval(K.fused_bias_act(x, bias)),
+                        x_val + bias_val, atol=1e-6)
+        assert_allclose(K.eval(K.fused_bias_act(x, None, K.tanh)),
+                        np.tanh(x_val), atol=1e-6)
+
     # the Theano and TensorFlow CTC code use different methods to ensure
     # numerical stability.  The Theano code subtracts out the max
     # before the final log, so the results are different but scale
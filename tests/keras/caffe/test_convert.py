@@ -1,6 +1,13 @@
 from __future__ import print_function
+import io
 import pytest
+import numpy as np
+from keras.caffe import caffe_pb2
 import keras.caffe.convert as convert
+try:
+    from unittest.mock import patch
+except:
+    from mock import patch
 
 
 def test_convertGoogleNet():
@@ -21,6 +28,115 @@ def test_convertGoogleNet():
     # model.save_weights(store_path + '/Keras_model_weights.h5', overwrite=True)
 
 
+def test_rot90():
+    W = np.random.random((4, 3, 5, 5)).astype('float32')
+    expected = np.empty_like(W)
+    for i in range(W.shape[0]):
+        for j in range(W.shape[1]):
+            expected[i, j] = np.rot90(W[i, j], 2)
+    assert np.array_equal(convert.rot90(W), expected)
+
+
+def test_read_varint():
+    f = io.BytesIO(b'\x01\xac\x02')
+    assert convert._read_varint(f) == 1
+    assert convert._read_varint(f) == 300
+    assert convert._read_varint(f) is None
+
+
+def _add_blob(layer, values, shape):
+    blob = layer.blobs.add()
+    blob.shape.dim.extend(shape)
+    blob.data.extend(values.ravel().tolist())
+
+
+def _write_net(tmpdir, name='net.caffemodel', version='V2'):
+    kernel = np.random.random((2, 1, 3, 3)).astype('float32')
+    conv_bias = np.random.random((2,)).astype('float32')
+    dense = np.random.random((3, 4)).astype('float32')
+    dense_bias = np.random.random((3,)).astype('float32')
+
+    net = caffe_pb2.NetParameter()
+    net.name = 'test_net'
+    if version == 'V2':
+        data = net.layer.add()
+        data.name = 'data'
+        data.type = 'Data'
+        conv = net.layer.add()
+        conv.name = 'conv'
+        conv.type = 'Convolution'
+        _add_blob(conv, kernel, kernel.shape)
+        _add_blob(conv, conv_bias, conv_bias.shape)
+        fc = net.layer.add()
+        fc.name = 'fc'
+        fc.type = 'InnerProduct'
+        _add_blob(fc, dense, dense.shape)
+        _add_blob(fc, dense_bias, dense_bias.shape)
+    else:
+        fc = net.layers.add()
+        fc.name = 'fc'
+        fc.type = caffe_pb2.V1LayerParameter.INNER_PRODUCT
+        blob = fc.blobs.add()
+        blob.num, blob.channels, blob.height, blob.width = 1, 1, 3, 4
+        blob.data.extend(dense.ravel().tolist())
+        blob = fc.blobs.add()
+        blob.num, blob.channels, blob.height, blob.width = 1, 1, 1, 3
+        blob.data.extend(dense_bias.ravel().tolist())
+
+    path = str(tmpdir.join(name))
+    with open(path, 'wb') as f:
+        f.write(net.SerializeToString())
+    return path, {'conv': [convert.rot90(kernel), conv_bias],
+                  'fc': [dense.T, dense_bias]}
+
+
+def test_iter_caffemodel_layers(tmpdir):
+    path, expected = _write_net(tmpdir)
+    layers = list(convert.iter_caffemodel_layers(path))
+    assert [layer.name for layer, _ in layers] == ['data', 'conv', 'fc']
+    assert all(v == 'V2' for _, v in layers)
+
+    weights = convert.get_converted_weights(path)
+    assert sorted(weights.keys()) == ['conv', 'fc']
+    for name in expected:
+        for w, e in zip(weights[name], expected[name]):
+            assert w.dtype == np.float32
+            np.testing.assert_allclose(w, e)
+
+    path, expected = _write_net(tmpdir, 'net_v1.caffemodel', version='V1')
+    layers = list(convert.iter_caffemodel_layers(path))
+    assert [(layer.name, v) for layer, v in layers] == [('fc', 'V1')]
+    weights = convert.get_converted_weights(path)
+    np.testing.assert_allclose(weights['fc'][0], expected['fc'][0])
+
+    empty_path = str(tmpdir.join('empty.caffemodel'))
+    with open(empty_path, 'wb') as f:
+        f.write(caffe_pb2.NetParameter(name='empty').SerializeToString())
+    with pytest.raises(Exception):
+        list(convert.iter_caffemodel_layers(empty_path))
+
+
+def test_caffemodel_to_hdf5(tmpdir):
+    path, expected = _write_net(tmpdir)
+    h5_path = str(tmpdir.join('weights.h5'))
+    assert convert.caffemodel_to_hdf5(path, h5_path) == h5_path
+    weights = convert.load_converted_weights(h5_path)
+    assert sorted(weights.keys()) == ['conv', 'fc']
+    for name in expected:
+        for w, e in zip(weights[name], expected[name]):
+            np.testing.assert_allclose(w, e)
+
+    # Converted weights are cached by caffemodel hash.
+    cache_dir = str(tmpdir.join('cache'))
+    with patch('keras.caffe.convert.caffemodel_to_hdf5',
+               wraps=convert.caffemodel_to_hdf5) as mock:
+        convert.get_converted_weights(path, cache_dir=cache_dir)
+        weights = convert.get_converted_weights(path, cache_dir=cache_dir)
+        assert mock.call_count == 1
+    assert len(tmpdir.join('cache').listdir()) == 1
+    np.testing.assert_allclose(weights['fc'][0], expected['fc'][0])
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
     # test_convertGoogleNet()
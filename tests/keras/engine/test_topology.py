@@ -1,5 +1,6 @@
 import pytest
 import json
+import time
 import numpy as np
 
 from keras.layers import Dense, Dropout, Conv2D, InputLayer
@@ -803,5 +804,198 @@ def test_constant_initializer_with_numpy():
     model_from_yaml(yaml_str).summary()
 
 
+def test_compact_json_round_trip():
+    x = Input(shape=(4, 8))
+    shared = Dense(8)
+    h = shared(layers.TimeDistributed(Dense(8))(shared(x)))
+    h2 = layers.TimeDistributed(Dense(8))(h)
+    model = Model(x, layers.add([h, h2]))
+
+    json_str = model.to_json(compact=True)
+    assert len(json_str) < len(model.to_json())
+    config = json.loads(json_str)['config']
+    assert len(config['shared_layer_configs']) == 1
+    assert model_from_json(json_str).get_config() == model.get_config()
+
+    seq = Sequential([Dense(3, input_shape=(2,)), Dense(3), Dense(3)])
+    json_str = seq.to_json(compact=True)
+    assert model_from_json(json_str).get_config() == seq.get_config()
+
+
+def test_from_config_with_missing_inbound_layer():
+    x = Input(shape=(2,))
+    model = Model(x, Dense(2)(Dense(2)(x)))
+    config = model.get_config()
+    config['layers'][2]['inbound_nodes'][0][0][0] = 'missing_layer'
+    with pytest.raises(ValueError):
+        Model.from_config(config)
+
+
+def _build_shared_chain(depth):
+    x = Input(shape=(8,))
+    shared = Dense(8)
+    h = x
+    for i in range(depth):
+        h = Dense(8)(h) if i % 2 else shared(h)
+    return Model(x, h)
+
+
+def test_config_round_trip_benchmark():
+    # A layer shared at every other depth used to make `from_config`
+    # sweep over all the layers once per depth.
+    times = []
+    depths = [16, 64]
+    for depth in depths:
+        model = _build_shared_chain(depth)
+        start_time = time.time()
+        config = model.get_config()
+        new_model = Model.from_config(config)
+        times.append(time.time() - start_time)
+        assert len(new_model.layers) == len(model.layers)
+        assert len(new_model.layers[1]._inbound_nodes) == depth // 2
+    print('config round trip time per layer:',
+          [t / d for t, d in zip(times, depths)])
+    scale = depths[1] / depths[0]
+    assert times[1] / times[0] < 3 * scale
+
+
+def test_cached_collections_invalidation():
+    x = Input(shape=(3,))
+    dense = Dense(2)
+    bn = layers.BatchNormalization()
+    model = Model(x, bn(dense(x)))
+    assert len(model.trainable_weights) == 4
+    assert len(model.non_trainable_weights) == 2
+    assert len(model.updates) == 2
+    assert model.losses == []
+
+    # Returned lists are copies.
+    model.trainable_weights.append(None)
+    assert len(model.trainable_weights) == 4
+
+    dense.trainable = False
+    assert len(model.trainable_weights) == 2
+    assert len(model.non_trainable_weights) == 4
+    dense.trainable = True
+    model.trainable = False
+    assert model.trainable_weights == []
+    assert model.updates == []
+    model.trainable = True
+
+    dense.add_loss(K.sum(dense.kernel))
+    assert len(model.losses) == 1
+
+    # New nodes created by calling the model on new inputs.
+    y = model(Input(shape=(3,)))
+    assert len(model.updates) == 2
+    outer = Model(x, model(x))
+    assert len(outer.updates) == 2
+    dense.add_weight('extra', (1,), initializer='zeros', trainable=False)
+    assert len(outer.non_trainable_weights) == 3
+
+    seq = Sequential()
+    seq.add(Dense(2, input_shape=(3,)))
+    assert len(seq.trainable_weights) == 2
+    seq.add(Dense(2))
+    assert len(seq.trainable_weights) == 4
+    seq.pop()
+    assert len(seq.trainable_weights) == 2
+
+
+def test_cached_collections_benchmark():
+    x = inputs = Input(shape=(4,))
+    for _ in range(10):
+        block_inputs = Input(shape=(4,))
+        h = block_inputs
+        for _ in range(30):
+            h = Dense(4)(h)
+        x = Model(block_inputs, h)(x)
+    model = Model(inputs, x)
+
+    start_time = time.time()
+    for _ in range(10):
+        model.trainable_weights
+        model.non_trainable_weights
+        model.updates
+        model.losses
+        model.state_updates
+    print('collections access time:', time.time() - start_time)
+    start_time = time.time()
+    model.compile('sgd', 'mse')
+    print('compile time:', time.time() - start_time)
+    assert len(model.trainable_weights) == 600
+
+
+def test_node_index():
+    x = Input(shape=(3,))
+    shared = Dense(3)
+    y1 = shared(x)
+    y2 = shared(y1)
+    for i, node in enumerate(shared._inbound_nodes):
+        assert node.node_index == i
+    model = Model(x, [y1, y2])
+    assert model.compute_output_shape((None, 3)) == [(None, 3), (None, 3)]
+    assert model.compute_output_shape([(5, 3)]) == [(5, 3), (5, 3)]
+
+
+def test_layer_shared_many_times_benchmark():
+    # Graph traversals used to search each node in the inbound nodes
+    # of its layer, which is quadratic for a layer shared many times.
+    n = 10000
+    start_time = time.time()
+    x = Input(shape=(2,))
+    shared = Dense(1, use_bias=False)
+    outputs = [shared(x) for _ in range(n)]
+    build_time = time.time()
+    model = Model(x, layers.concatenate(outputs))
+    model_time = time.time()
+    assert model.compute_output_shape((None, 5)) == (None, n)
+    shape_time = time.time()
+    y = model(Input(shape=(2,)))
+    call_time = time.time()
+    assert K.int_shape(y) == (None, n)
+    print('layer calls: %.2fs, model: %.2fs, '
+          'output shape: %.2fs, model call: %.2fs' % (
+              build_time - start_time, model_time - build_time,
+              shape_time - model_time, call_time - shape_time))
+    assert model_time - build_time < build_time - start_time
+    assert shape_time - model_time < build_time - start_time
+
+
+def test_execution_plan_reuse_benchmark():
+    x = Input(shape=(5, 4))
+    h = x
+    for _ in range(20):
+        h = Dense(4)(h)
+    encoder = Model(x, layers.Masking()(h))
+    encoder_calls = 10
+
+    def call_encoder(reset_plan):
+        start_time = time.time()
+        outputs = []
+        for _ in range(encoder_calls):
+            if reset_plan:
+                encoder._execution_plan = None
+            outputs.append(encoder(Input(shape=(5, 4))))
+        return time.time() - start_time, outputs
+
+    without_plan_time, _ = call_encoder(reset_plan=True)
+    plan = encoder._execution_plan
+    # The input layer, 20 Dense layers and the masking layer.
+    assert len(plan[0]) == 22
+    with_plan_time, outputs = call_encoder(reset_plan=False)
+    assert encoder._execution_plan is plan
+    for y in outputs:
+        assert K.int_shape(y) == (None, 5, 4)
+        assert y._keras_shape == (None, 5, 4)
+    print('graph build time without plan reuse: %.3fs, with: %.3fs' % (
+        without_plan_time, with_plan_time))
+
+    # Masks and nested calls go through the plan.
+    model = Model(x, layers.LSTM(2)(encoder(x)))
+    assert K.int_shape(layers.TimeDistributed(model)(
+        Input(shape=(3, 5, 4)))) == (None, 3, 2)
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -1,4 +1,5 @@
 import threading
+import time
 
 import pytest
 import numpy as np
@@ -10,6 +11,7 @@ import scipy.sparse as sparse
 import keras
 from keras import losses
 from keras.layers import Activation, Dense, Dropout, Conv2D, Concatenate
+from keras.layers import Add, BatchNormalization, Embedding, LSTM
 from keras.engine import Input
 from keras.engine.training import Model
 from keras.engine import training_utils
@@ -1535,5 +1537,160 @@ def test_dynamic_set_inputs():
     assert preds4.shape == (1, 19)
 
 
+@pytest.mark.skipif(K.backend() == 'cntk',
+                    reason='Profiling requires TensorFlow or Theano')
+def test_layer_profiling():
+    inputs = Input(shape=(8,))
+    hidden = Dense(16, activation='relu', name='hidden')(inputs)
+    outputs = Dense(2, name='output')(hidden)
+    model = Model(inputs, outputs)
+    model.compile('sgd', 'mse', profile=True)
+
+    x = np.random.random((32, 8))
+    y = np.random.random((32, 2))
+    model.fit(x, y, batch_size=8, epochs=1, verbose=0)
+    model.predict(x, batch_size=16)
+    assert model._layer_profile.calls == 6
+
+    stats = model._layer_profile.get_stats()
+    assert sum(f + b for f, b, _ in stats.values()) > 0
+    if K.backend() == 'tensorflow':
+        forward, backward, num_bytes = stats['hidden']
+        assert forward > 0 and backward > 0 and num_bytes > 0
+
+    lines = []
+    model.profile_summary(print_fn=lines.append, reset=True)
+    assert any(line.startswith('hidden (Dense)') for line in lines)
+    assert any(line.startswith('output (Dense)') for line in lines)
+    assert model._layer_profile.calls == 0
+
+    model.compile('sgd', 'mse')
+    with pytest.raises(RuntimeError):
+        model.profile_summary()
+
+
+@pytest.mark.skipif(K.backend() == 'cntk',
+                    reason='Checkpointing requires TensorFlow or Theano')
+def test_gradient_checkpointing():
+    def build_model():
+        np.random.seed(1337)
+        inputs = Input(shape=(6,))
+        x = Embedding(10, 4, mask_zero=True)(inputs)
+        for i in range(4):
+            x = LSTM(4, return_sequences=True)(x)
+            if i == 1:
+                x = BatchNormalization()(x)
+        x = Dropout(0.)(x)
+        y = Dense(3)(x)
+        outputs = Add()([x, Dense(4)(y)])
+        model = Model(inputs, [outputs, y])
+        return model
+
+    x = np.random.randint(0, 10, (8, 6))
+    x[:, -2:] = 0
+    y = [np.random.random((8, 6, 4)), np.random.random((8, 6, 3))]
+    model = build_model()
+    model.compile('sgd', 'mse')
+    reference = [model.train_on_batch(x, y), model.get_weights()]
+    model = build_model()
+    model.compile('sgd', 'mse', checkpoint_segments=3)
+    checkpointed = [model.train_on_batch(x, y), model.get_weights()]
+    for a, b in zip(reference[0], checkpointed[0]):
+        assert_allclose(a, b, rtol=1e-5)
+    for a, b in zip(reference[1], checkpointed[1]):
+        assert_allclose(a, b, rtol=1e-5, atol=1e-6)
+
+    with pytest.raises(ValueError):
+        model.checkpointed_outputs(0)
+
+
+def _peak_training_bytes(model, x, y):
+    import tensorflow as tf
+    run_metadata = tf.RunMetadata()
+    model._function_kwargs = {
+        'options': tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
+        'run_metadata': run_metadata}
+    model.train_function = None
+    model._make_train_function()
+    model.train_on_batch(x, y)
+    records = []
+    for dev_stats in run_metadata.step_stats.dev_stats:
+        for node_stats in dev_stats.node_stats:
+            for memory in node_stats.memory:
+                records.extend((record.alloc_micros, record.alloc_bytes)
+                               for record in memory.allocation_records)
+    records.sort()
+    return int(np.cumsum([num_bytes for _, num_bytes in records]).max())
+
+
+@pytest.mark.skipif(K.backend() != 'tensorflow',
+                    reason='Memory is measured with TensorFlow traces')
+def test_gradient_checkpointing_benchmark():
+    def residual_model():
+        inputs = Input(shape=(64,))
+        x = inputs
+        for _ in range(40):
+            x = Add()([x, Dense(64, activation='relu')(x)])
+        model = Model(inputs, Dense(1)(x))
+        return model, np.random.random((64, 64)), np.random.random((64, 1))
+
+    def decoder_model():
+        inputs = Input(shape=(200,))
+        x = Embedding(50, 16)(inputs)
+        for _ in range(4):
+            x = LSTM(16, return_sequences=True)(x)
+        model = Model(inputs, Dense(50, activation='softmax')(x))
+        return (model, np.random.randint(0, 50, (8, 200)),
+                np.random.randint(0, 50, (8, 200, 1)))
+
+    for build_model, segments in [(residual_model, 7), (decoder_model, 2)]:
+        results = []
+        for checkpoint_segments in [None, segments]:
+            K.clear_session()
+            model, x, y = build_model()
+            model.compile('sgd', 'sparse_categorical_crossentropy'
+                          if build_model is decoder_model else 'mse',
+                          checkpoint_segments=checkpoint_segments)
+            model.train_on_batch(x, y)
+            start_time = time.time()
+            for _ in range(3):
+                model.train_on_batch(x, y)
+            step_time = (time.time() - start_time) / 3
+            results.append((step_time, _peak_training_bytes(model, x, y)))
+        (base_time, base_bytes), (time_, num_bytes) = results
+        print('%s: step %.1fms -> %.1fms, peak memory %dKB -> %dKB' % (
+            build_model.__name__, base_time * 1e3, time_ * 1e3,
+            base_bytes // 1024, num_bytes // 1024))
+        assert num_bytes < 0.75 * base_bytes
+
+
+def test_warm_up():
+    inputs = Input(shape=(None,))
+    x = Embedding(10, 4)(inputs)
+    x = LSTM(4, return_sequences=True)(x)
+    model = Model(inputs, Dense(3, activation='softmax')(x))
+    model.compile('sgd', 'sparse_categorical_crossentropy',
+                  shape_cache_size=4)
+    weights = model.get_weights()
+    buckets = [(np.random.randint(0, 10, (4, length)),
+                np.random.randint(0, 3, (4, length, 1)))
+               for length in [3, 5]]
+    for x, y in buckets:
+        model.warm_up(x, y)
+        model.warm_up(x)
+    for a, b in zip(weights, model.get_weights()):
+        assert_allclose(a, b)
+
+    for x, y in buckets:
+        model.train_on_batch(x, y)
+        model.test_on_batch(x, y)
+        assert_allclose(model.predict_on_batch(x), model.predict(x),
+                        rtol=1e-5)
+    if K.backend() == 'theano':
+        for f in [model.train_function, model.test_function,
+                  model.predict_function]:
+            assert f.cache_misses == 0
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -125,6 +125,81 @@ def test_io_utils(in_tmpdir):
     os.remove(h5_path)
 
 
+def test_hdf5_matrix_unsorted_indices(in_tmpdir):
+    _, h5_path = tempfile.mkstemp('.h5')
+    create_dataset(h5_path)
+    with h5py.File(h5_path, 'r') as f:
+        X = f['my_data'][:]
+
+    X_train = HDF5Matrix(h5_path, 'my_data', start=10, end=150)
+    index_array = np.random.permutation(len(X_train))[:32]
+    assert_allclose(X_train[index_array], X[10 + index_array])
+    assert_allclose(X_train[index_array.tolist()], X[10 + index_array])
+    # Duplicated indices are allowed too.
+    assert_allclose(X_train[[3, 1, 3]], X[[13, 11, 13]])
+    os.remove(h5_path)
+
+
+def test_hdf5_matrix_cache(in_tmpdir):
+    _, h5_path = tempfile.mkstemp('.h5')
+    create_dataset(h5_path)
+    with h5py.File(h5_path, 'r') as f:
+        X = f['my_data'][:]
+
+    normalizer = lambda x: x * 2
+    X_train = HDF5Matrix(h5_path, 'my_data', start=5, end=150,
+                         normalizer=normalizer, cache_size=4,
+                         chunk_size=16, read_ahead=2)
+    index_array = np.random.permutation(len(X_train))
+    for i in range(0, len(X_train), 32):
+        batch_ids = index_array[i:i + 32]
+        assert_allclose(X_train[batch_ids], X[5 + batch_ids] * 2)
+    assert_allclose(X_train[3], X[8] * 2)
+    assert_allclose(X_train[0:20], X[5:25] * 2)
+    assert len(X_train._cache) <= 4
+
+    # Sequential access hits the blocks loaded by read-ahead.
+    X_seq = HDF5Matrix(h5_path, 'my_data', cache_size=8,
+                       chunk_size=10, read_ahead=3)
+    for i in range(0, 200, 10):
+        assert_allclose(X_seq[i:i + 10], X[i:i + 10])
+    assert X_seq.cache_misses == 6
+    assert X_seq.cache_hits == 14
+
+    # Read-ahead is limited by the cache size.
+    X_small = HDF5Matrix(h5_path, 'my_data', cache_size=2,
+                         chunk_size=10, read_ahead=3)
+    for i in range(0, 200, 10):
+        assert_allclose(X_small[i:i + 10], X[i:i + 10])
+    assert X_small.cache_misses == 11
+    assert len(X_small._cache) == 2
+
+    with pytest.raises(ValueError):
+        HDF5Matrix(h5_path, 'my_data', cache_size=-1)
+    os.remove(h5_path)
+
+
+def test_hdf5_matrix_negative_and_empty_keys(in_tmpdir):
+    _, h5_path = tempfile.mkstemp('.h5')
+    create_dataset(h5_path)
+    with h5py.File(h5_path, 'r') as f:
+        X = f['my_data'][:]
+
+    for cache_size in [0, 2]:
+        X_train = HDF5Matrix(h5_path, 'my_data', start=10, end=150,
+                             cache_size=cache_size, chunk_size=64)
+        assert_allclose(X_train[-1], X[149])
+        assert_allclose(X_train[-140], X[10])
+        assert_allclose(X_train[[-1, 0]], X[[149, 10]])
+        assert X_train[[]].shape == (0, 10)
+        assert X_train[np.array([], dtype='int32')].shape == (0, 10)
+        with pytest.raises(IndexError):
+            X_train[-141]
+        with pytest.raises(IndexError):
+            X_train[[-141]]
+    os.remove(h5_path)
+
+
 def test_ask_to_proceed_with_overwrite():
     with patch('six.moves.input') as mock:
         mock.return_value = 'y'
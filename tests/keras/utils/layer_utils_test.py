@@ -2,9 +2,12 @@ import pytest
 import numpy as np
 from numpy.testing import assert_allclose
 from keras import backend as K
+from keras.layers import Conv1D
 from keras.layers import Conv2D
 from keras.layers import Dense
 from keras.layers import Flatten
+from keras.layers import Input
+from keras.models import Model
 from keras.models import Sequential
 from keras.utils import layer_utils
 
@@ -60,5 +63,68 @@ def test_convert_weights():
         assert_allclose(out1, out2, atol=1e-5)
 
 
+def test_quantization_report():
+    model = Sequential()
+    model.add(Dense(16, input_shape=(8,)))
+    model.add(Dense(4, activation='softmax'))
+    x = np.random.random((10, 8))
+    weights = model.get_weights()
+
+    lines = []
+    report = layer_utils.quantization_report(model, x, print_fn=lines.append)
+    assert [name for name, _ in report['weights']] == [
+        model.layers[0].kernel.name, model.layers[1].kernel.name]
+    for _, error in report['weights']:
+        assert 0 < error < 0.01
+    delta = report['outputs'][0]
+    assert delta['max_abs_diff'] < 1e-2
+    assert 0 <= delta['argmax_agreement'] <= 1
+    assert lines
+    # The original weights are restored.
+    for value, new_value in zip(weights, model.get_weights()):
+        assert_allclose(value, new_value)
+
+
+def test_estimate_memory():
+    model = Sequential([Dense(100, input_shape=(50,)), Dense(10)])
+    memory = layer_utils.estimate_memory(model, 32, optimizer='adam')
+    assert memory['layers'] == [(model.layers[0].name, 32 * 100 * 4),
+                                (model.layers[1].name, 32 * 10 * 4)]
+    # Input and first layer outputs are live together.
+    assert memory['peak_inference_bytes'] == 32 * (50 + 100) * 4
+    # Backward pass of the last layer: all activations, plus the
+    # gradients of its input and output.
+    assert memory['peak_training_bytes'] == 32 * (160 + 110) * 4
+    assert memory['parameter_bytes'] == 6110 * 4
+    assert memory['optimizer_bytes'] == 2 * memory['gradient_bytes']
+    assert memory['training_bytes'] == (4 * 6110 * 4 +
+                                        memory['peak_training_bytes'])
+
+    # Variable-length inputs and strided layers.
+    inputs = Input(shape=(None, 16))
+    x = Conv1D(4, 3, strides=2)(inputs)
+    branch = Conv1D(2, 1)(inputs)
+    model = Model(inputs, [x, branch])
+    with pytest.raises(ValueError):
+        layer_utils.estimate_memory(model, 8)
+    memory = layer_utils.estimate_memory(model, 8, sequence_length=21)
+    assert dict(memory['layers'])[model.layers[1].name] == 8 * 10 * 4 * 4
+    assert memory['optimizer_bytes'] == 0
+
+    batch_size = layer_utils.max_batch_size(model, 0.01,
+                                            sequence_length=21)
+    budget = 0.01 * 2 ** 30
+    assert layer_utils.estimate_memory(
+        model, batch_size, sequence_length=21)['training_bytes'] <= budget
+    assert layer_utils.estimate_memory(
+        model, batch_size + 1, sequence_length=21)['training_bytes'] > budget
+
+    lines = []
+    model.summary(print_fn=lines.append, batch_size=8, sequence_length=21)
+    assert 'Activations' in lines[1]
+    assert any(line.startswith('Total (inference / training)')
+               for line in lines)
+
+
 if __name__ == '__main__':
     pytest.main([__file__])
@@ -12,7 +12,7 @@ from keras.models import Model, Sequential
 from keras.layers import Dense, Lambda, RepeatVector, TimeDistributed
 from keras.layers import Bidirectional, GRU, LSTM, CuDNNGRU, CuDNNLSTM
 from keras.layers import Conv2D, Flatten
-from keras.layers import Input, InputLayer
+from keras.layers import Input, InputLayer, Embedding
 from keras.initializers import Constant
 from keras import optimizers
 from keras import losses
@@ -59,6 +59,30 @@ def test_sequential_model_saving():
     assert_allclose(out, out2, atol=1e-05)
 
 
+def test_model_saving_with_function_cache(tmpdir):
+    model = Sequential()
+    model.add(Dense(2, input_shape=(3,)))
+    model.add(Dense(3))
+    model.compile(loss='mse', optimizer='rmsprop')
+    x = np.random.random((1, 3))
+    y = np.random.random((1, 3))
+    model.train_on_batch(x, y)
+    out = model.predict(x)
+
+    fname = str(tmpdir.join('model.h5'))
+    save_model(model, fname)
+    K.set_function_cache_dir(str(tmpdir.join('functions')))
+    try:
+        for _ in range(2):
+            new_model = load_model(fname)
+            # The prediction function is warm-started while loading.
+            assert new_model.predict_function is not None
+            assert_allclose(out, new_model.predict(x), atol=1e-05)
+            new_model.train_on_batch(x, y)
+    finally:
+        K.set_function_cache_dir(None)
+
+
 def test_sequential_model_saving_2():
     # test with custom optimizer, loss
     custom_opt = optimizers.rmsprop
@@ -812,5 +836,41 @@ def test_preprocess_weights_for_loading_gru_incompatible():
                           'GRU(reset_after=False)')
 
 
+@pytest.mark.parametrize('mode', ['int8', 'float16'])
+def test_saving_weights_quantized(mode):
+    inputs = Input(shape=(5,), dtype='int32')
+    x = Embedding(1000, 32)(inputs)
+    x = LSTM(16)(x)
+    outputs = Dense(1000)(x)
+    model = Model(inputs, outputs)
+    x = np.random.randint(0, 1000, size=(4, 5))
+    out = model.predict(x)
+    weights = model.get_weights()
+
+    _, fname = tempfile.mkstemp('.h5')
+    _, quantized_fname = tempfile.mkstemp('.h5')
+    model.save_weights(fname)
+    model.save_weights(quantized_fname, quantize=mode)
+    ratio = os.path.getsize(quantized_fname) / float(os.path.getsize(fname))
+    assert ratio < (0.4 if mode == 'int8' else 0.6)
+
+    model.load_weights(quantized_fname)
+    os.remove(fname)
+    os.remove(quantized_fname)
+    for w, value in zip(model.weights, weights):
+        loaded = K.get_value(w)
+        assert loaded.dtype == value.dtype
+        if value.ndim == 1:
+            # Biases are not quantized.
+            assert_allclose(loaded, value)
+        else:
+            tolerance = np.abs(value).max() / (127 if mode == 'int8' else 1000)
+            assert_allclose(loaded, value, atol=tolerance)
+    assert_allclose(model.predict(x), out, atol=1e-2)
+
+    with pytest.raises(ValueError):
+        model.save_weights(quantized_fname, quantize='int4')
+
+
 if __name__ == '__main__':
     pytest.main([__file__])